@@ -0,0 +1,11 @@
+@echo off
+echo ========================================
+echo Daily TLA Dashboard
+echo ========================================
+echo.
+echo Starting the dashboard server...
+echo Open http://127.0.0.1:8765/ in your browser.
+echo Press Ctrl+C to stop the server.
+echo.
+python dashboard.py
+pause 
\ No newline at end of file
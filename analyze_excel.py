@@ -1,7 +1,21 @@
 import pandas as pd
 import sys
+import os
+import argparse
+import concurrent.futures
+from datetime import timedelta
 from pathlib import Path
 
+import duckdb
+
+from generate_daily_report import (ESSENTIAL_COLS, parquet_cache_path, cache_is_fresh, list_excel_files,
+                                   _load_manifest, _sql_path_list)
+
+# Columns whose cardinality is reported by the profiler
+KEY_COLS = ['Syndrom', 'UUT', 'SerialNumber']
+# Rows parsed to infer column types when a cache predates the manifest's source schema
+SCHEMA_SAMPLE_ROWS = 200
+
 def analyze_excel_file(file_path):
     """Analyze Excel file structure and content"""
     try:
@@ -15,7 +29,8 @@ def analyze_excel_file(file_path):
         # Analyze each sheet
         for sheet_name in excel_file.sheet_names:
             print(f"\nSheet: {sheet_name}")
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
+            # Parse from the already opened workbook instead of re-reading the file
+            df = excel_file.parse(sheet_name)
             
             print(f"Shape: {df.shape} (rows, columns)")
             print(f"Columns: {list(df.columns)}")
@@ -42,15 +57,226 @@ def analyze_excel_file(file_path):
         print(f"Error analyzing file: {e}")
         return None
 
+# ------------------------------------------------------------------
+# Fast dataset profiler (all exports, parallel, cache-aware)
+
+def _type_kind(dtype):
+    """Collapse pandas/DuckDB type names into a comparable kind for schema-drift checks."""
+    name = str(dtype).lower()
+    if 'datetime' in name or 'timestamp' in name or name == 'date':
+        return 'datetime'
+    if any(t in name for t in ('int', 'float', 'double', 'decimal', 'bigint')):
+        return 'number'
+    if 'bool' in name:
+        return 'bool'
+    return 'string'
+
+def _profile_parquet(parquet_path, sample):
+    """Profile a cached workbook with DuckDB without materialising it in pandas."""
+    con = duckdb.connect()
+    src = f"read_parquet({_sql_path_list([parquet_path])})"
+    sampled = f"(SELECT * FROM {src} USING SAMPLE {int(sample)} ROWS)" if sample else src
+    summary = con.execute(f"SUMMARIZE SELECT * FROM {sampled}").df()
+    rows = con.execute(f"SELECT COUNT(*) FROM {src}").fetchone()[0]
+    columns = dict(zip(summary['column_name'], summary['column_type']))
+    nulls = {c: float(p) for c, p in zip(summary['column_name'], summary['null_percentage'])}
+    present = [c for c in KEY_COLS if c in columns]
+    cardinality = {}
+    if present:
+        counts = con.execute(
+            "SELECT " + ", ".join(f'COUNT(DISTINCT "{c}")' for c in present) + f" FROM {sampled}"
+        ).fetchone()
+        cardinality = dict(zip(present, counts))
+    dates = []
+    if 'StartDateTime' in columns:
+        # Date coverage always comes from the full cache; it is a cheap single-column scan
+        dates = [r[0] for r in con.execute(
+            f"SELECT DISTINCT CAST(StartDateTime AS DATE) FROM {src} WHERE StartDateTime IS NOT NULL"
+        ).fetchall()]
+    con.close()
+    return [{'sheet': '(parquet cache)', 'rows': rows, 'columns': columns,
+             'null_pct': nulls, 'cardinality': cardinality, 'dates': dates}]
+
+def _profile_sheet(sheet_name, df):
+    """Profile one parsed sheet."""
+    columns = {c: str(df[c].dtype) for c in df.columns}
+    null_pct = (df.isnull().mean() * 100).round(2).to_dict() if len(df) else {}
+    cardinality = {c: int(df[c].nunique()) for c in KEY_COLS if c in df.columns}
+    dates = []
+    if 'StartDateTime' in df.columns:
+        ts = pd.to_datetime(df['StartDateTime'], errors='coerce').dropna()
+        dates = sorted(set(ts.dt.date))
+    return {'sheet': sheet_name, 'rows': len(df), 'columns': columns,
+            'null_pct': null_pct, 'cardinality': cardinality, 'dates': dates}
+
+def _excel_schema(file_path):
+    """Columns and dtypes of an export's first sheet, inferred from its first rows."""
+    df = pd.read_excel(file_path, nrows=SCHEMA_SAMPLE_ROWS)
+    return {c: str(df[c].dtype) for c in df.columns}
+
+def profile_file(args):
+    """Profile one export; top-level so it can run in a worker process.
+
+    Parameters
+    ----------
+    args : tuple(file_path, sample)
+        ``sample`` limits the number of rows inspected (None = all rows).
+    """
+    file_path, sample = args
+    result = {'file': str(file_path), 'size_mb': os.path.getsize(file_path) / (1024 * 1024),
+              'sampled': bool(sample), 'sheets': [], 'error': None}
+    try:
+        if cache_is_fresh(file_path):
+            result['source'] = 'parquet cache'
+            result['sheets'] = _profile_parquet(parquet_cache_path(file_path), sample)
+            # The cache is padded and cast to text, so drift is judged on the export's own columns
+            entry = _load_manifest().get(os.path.basename(file_path), {})
+            result['schema'] = entry.get('source_columns') or _excel_schema(file_path)
+        else:
+            result['source'] = 'excel'
+            # sheet_name=None parses every sheet in a single pass over the workbook;
+            # with sampling only the first ``sample`` rows of each sheet are parsed
+            sheets = pd.read_excel(file_path, sheet_name=None, nrows=sample)
+            result['sheets'] = [_profile_sheet(name, df) for name, df in sheets.items()]
+            result['schema'] = result['sheets'][0]['columns'] if result['sheets'] else {}
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+def _date_gaps(dates):
+    """Return (first, last) runs of calendar days missing between min(dates) and max(dates)."""
+    gaps = []
+    ordered = sorted(dates)
+    for prev, cur in zip(ordered, ordered[1:]):
+        if (cur - prev).days > 1:
+            gaps.append((prev + timedelta(days=1), cur - timedelta(days=1)))
+    return gaps
+
+def _overall_cardinality(files):
+    """Exact distinct counts across every export that has a fresh Parquet cache."""
+    cached = [parquet_cache_path(f) for f in files if cache_is_fresh(f)]
+    if not cached:
+        return None, 0
+    con = duckdb.connect()
+    counts = con.execute(
+        "SELECT " + ", ".join(f"COUNT(DISTINCT {c})" for c in KEY_COLS)
+        + f" FROM read_parquet({_sql_path_list(cached)}, union_by_name=true)"
+    ).fetchone()
+    con.close()
+    return dict(zip(KEY_COLS, counts)), len(cached)
+
+def print_profile(results, files):
+    """Print per-file profiles plus cross-file cardinality, date coverage and schema drift."""
+    print("=== Dataset profile ===")
+    for res in results:
+        label = f"{res['file']} ({res['size_mb']:.1f} MB, {res.get('source', '?')}"
+        label += ", sampled)" if res['sampled'] else ")"
+        print(f"\n{label}")
+        if res['error']:
+            print(f"  Error: {res['error']}")
+            continue
+        for sheet in res['sheets']:
+            dates = sheet['dates']
+            span = f"{min(dates)} to {max(dates)}" if dates else "no dates"
+            print(f"  [{sheet['sheet']}] rows={sheet['rows']:,} cols={len(sheet['columns'])} dates={span}")
+            if sheet['cardinality']:
+                print("    distinct: " + ", ".join(f"{c}={n:,}" for c, n in sheet['cardinality'].items()))
+            high_nulls = {c: p for c, p in sheet['null_pct'].items() if c in ESSENTIAL_COLS and p > 0}
+            if high_nulls:
+                print("    null %:   " + ", ".join(f"{c}={p:.1f}" for c, p in high_nulls.items()))
+
+    ok = [r for r in results if not r['error'] and r['sheets']]
+    if not ok:
+        return
+
+    # Cardinality across all exports
+    overall, n_cached = _overall_cardinality(files)
+    if overall:
+        print(f"\nDistinct values across {n_cached} cached export(s): "
+              + ", ".join(f"{c}={n:,}" for c, n in overall.items()))
+
+    # Date coverage and gaps across all exports
+    all_dates = {}
+    for res in ok:
+        for sheet in res['sheets']:
+            for d in sheet['dates']:
+                all_dates.setdefault(d, set()).add(res['file'])
+    if all_dates:
+        print(f"\nDate coverage: {min(all_dates)} to {max(all_dates)} ({len(all_dates)} day(s) with data)")
+        gaps = _date_gaps(all_dates)
+        if gaps:
+            print("  Gaps (no data):")
+            for first, last in gaps:
+                print(f"    {first}" + (f" to {last}" if last != first else ""))
+        else:
+            print("  No gaps")
+        overlaps = sorted(d for d, owners in all_dates.items() if len(owners) > 1)
+        if overlaps:
+            print(f"  {len(overlaps)} day(s) appear in more than one export (e.g. {overlaps[0]})")
+
+    # Schema drift against ESSENTIAL_COLS (first sheet of every export, as exported)
+    kinds = {}
+    for res in ok:
+        for col, dtype in res['schema'].items():
+            kinds.setdefault(col, {}).setdefault(_type_kind(dtype), []).append(res['file'])
+    print("\nSchema drift vs ESSENTIAL_COLS:")
+    drift = False
+    for res in ok:
+        cols = res['schema']
+        missing = [c for c in ESSENTIAL_COLS if c not in cols]
+        extra = [c for c in cols if c not in ESSENTIAL_COLS]
+        if missing:
+            drift = True
+            print(f"  {res['file']}: missing {missing}")
+        if extra and res['source'] == 'excel':
+            print(f"  {res['file']}: {len(extra)} extra column(s) not loaded by the report")
+    for col in ESSENTIAL_COLS:
+        variants = kinds.get(col, {})
+        if len(variants) > 1:
+            drift = True
+            desc = "; ".join(f"{kind} in {len(owners)} file(s)" for kind, owners in variants.items())
+            print(f"  {col}: inconsistent types ({desc})")
+    if not drift:
+        print("  All exports contain ESSENTIAL_COLS with consistent types")
+
+def profile_files(files, sample=None, workers=None):
+    """Profile all exports in parallel and print the combined report."""
+    tasks = [(f, sample) for f in files]
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(profile_file, tasks))
+    else:
+        results = [profile_file(t) for t in tasks]
+    print_profile(results, files)
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze Excel export structure and content")
+    parser.add_argument('files', nargs='*', help="Workbooks to analyze (default: exports under the source roots)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Fast profile of every export (cache-aware, parallel) instead of the detailed dump")
+    parser.add_argument('--sample', type=int, metavar='N',
+                        help="Only inspect N rows per sheet (sampled from the cache, head of the sheet otherwise)")
+    parser.add_argument('--workers', type=int, metavar='N', help="Worker processes for --profile (default: CPU count)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    # Look for Excel files in current directory
-    excel_files = list(Path(".").glob("*.xlsx"))
+    args = parse_args()
+    if args.files:
+        excel_files = [Path(f) for f in args.files]
+    else:
+        # Same discovery as the report (source_roots.txt, or the current directory)
+        excel_files = [Path(f) for f in list_excel_files()]
     
     if not excel_files:
         print("No Excel files found in current directory")
         sys.exit(1)
     
-    # Analyze the first Excel file found
-    file_path = excel_files[0]
-    print(f"Analyzing: {file_path}")
-    analyze_excel_file(file_path) 
\ No newline at end of file
+    if args.profile:
+        profile_files(excel_files, sample=args.sample, workers=args.workers)
+    else:
+        # Analyze the first Excel file found (or every file given explicitly)
+        for file_path in (excel_files if args.files else excel_files[:1]):
+            print(f"Analyzing: {file_path}")
+            analyze_excel_file(file_path)
@@ -0,0 +1,228 @@
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from generate_daily_report import build_trend_tables, compute_shift_metrics, compute_sn_totals, detect_spikes, write_trend_sheets
+
+# ------------------------------------------------------------------
+# Synthetic SerialList data
+
+DAY_SECONDS = 24 * 3600
+# Accepted relative error of the HyperLogLog denominators (percent). The
+# sketches have ~0.8% standard error, so these only trip on a real regression.
+APPROX_MAX_MEAN_ERROR = 2.0
+APPROX_MAX_ERROR = 5.0
+
+
+def make_synthetic_frame(rows, days, uuts, syndroms=40, seed=0):
+    """``rows`` synthetic test rows spread over ``days``, sorted by StartDateTime.
+
+    Each SN is tested on one UUT a few times (retests), with a ~3% fail rate
+    spread over ``syndroms`` syndroms, so the distinct-SN denominators behave
+    like a real SerialList window. Returns (frame, start date, end date).
+    """
+    rng = np.random.default_rng(seed)
+    start = date(2025, 1, 1)
+    n_sns = max(rows // 3, 1)
+    sn_ids = rng.integers(0, n_sns, rows)
+    uut_ids = sn_ids % uuts
+    day = rng.integers(0, days, rows)
+    seconds = rng.integers(0, DAY_SECONDS, rows)
+    ts = pd.Timestamp(start) + pd.to_timedelta(day, unit='D') + pd.to_timedelta(seconds, unit='s')
+    failed = rng.random(rows) < 0.03
+    syndrom_names = np.array([f"Syndrom {i}" for i in range(syndroms)], dtype=object)
+    uut_names = np.array([f"UUT {i}" for i in range(uuts)], dtype=object)
+    df = pd.DataFrame({
+        'StartDateTime': ts,
+        'Syndrom': np.where(failed, syndrom_names[rng.integers(0, len(syndrom_names), rows)], None),
+        'SyndromStatus': np.where(failed, 'Fail', 'Pass'),
+        'UUT': uut_names[uut_ids],
+        'SerialNumber': "SN" + pd.Series(sn_ids).astype(str).str.zfill(9),
+    }).sort_values('StartDateTime', ignore_index=True)
+    return df, start, start + timedelta(days=days - 1)
+
+
+def make_synthetic_exports(out_dir, rows, days, uuts, files, seed=0):
+    """Write ``files`` Parquet caches of make_synthetic_frame() rows; returns (paths, start date, end date)."""
+    df, start, end = make_synthetic_frame(rows, days, uuts, seed=seed)
+    paths = []
+    bounds = np.linspace(0, rows, files + 1).astype(int)
+    for i, (lo, hi) in enumerate(zip(bounds, bounds[1:])):
+        path = os.path.join(out_dir, f"synthetic_{i}.parquet")
+        df.iloc[lo:hi].to_parquet(path, index=False)
+        paths.append(path)
+    return paths, start, end
+
+
+def make_spike_counts(history_days, window_days, syndroms, uuts, tested, seed=0, step=None):
+    """Stationary daily counts in load_daily_fail_counts() layout; returns (counts, report start).
+
+    Every Syndrom x UUT x shift series fails at a fixed random rate (0.2-3%;
+    2% for Syndrom 0) on about ``tested`` SNs per day. ``step`` = (day offset
+    into the window, fail multiplier) raises Syndrom 0 / UUT 0 / 1st Shift on
+    that one day only.
+    """
+    rng = np.random.default_rng(seed)
+    start = date(2025, 1, 1)
+    report_start = start + timedelta(days=history_days)
+    rates = rng.uniform(0.002, 0.03, syndroms)
+    rates[0] = 0.02
+    rows = []
+    for offset in range(history_days + window_days):
+        day = start + timedelta(days=offset)
+        for u in range(uuts):
+            for shift in ('1st Shift', '2nd Shift'):
+                n = int(rng.poisson(tested))
+                rows.append((day, f"UUT {u}", shift, None, True, 0, n))
+                fails = rng.binomial(n, rates)
+                if step and (offset - history_days, u, shift) == (step[0], 0, '1st Shift'):
+                    # Deterministic, so the random stream (and every other point) stays the same
+                    fails[0] = round(n * min(rates[0] * step[1], 1.0))
+                for s in np.flatnonzero(fails):
+                    rows.append((day, f"UUT {u}", shift, f"Syndrom {s}", False, int(fails[s]), n))
+    counts = pd.DataFrame(rows, columns=['Date', 'UUT', 'Shift', 'Syndrom', 'is_total', 'fails', 'tested'])
+    return counts, report_start
+
+
+def _best_of(repeat, func, *args, **kwargs):
+    """Run ``func`` ``repeat`` times; return (best wall seconds, last result)."""
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+# ------------------------------------------------------------------
+# Benchmarks
+
+def bench_approx(args, work_dir):
+    """Exact vs HyperLogLog unique-SN denominators (time and accuracy); False if the error is out of bounds.
+
+    Both modes time the same work – the per UUT x shift distinct-SN query and
+    nothing else – so the speed-up compares COUNT DISTINCT with HLL sketches.
+    The full exact shift-metrics pass (yields and retests too) is timed
+    separately for reference.
+    """
+    paths, start, end = make_synthetic_exports(work_dir, args.rows, args.days, args.uuts, args.files)
+    full_s, full = _best_of(args.repeat, compute_shift_metrics, paths, start, end)
+    exact_s, exact = _best_of(args.repeat, compute_sn_totals, paths, start, end)
+    approx_s, approx = _best_of(args.repeat, compute_sn_totals, paths, start, end, approx=True)
+    if exact != full['sn_totals']:
+        print("  FAILED: distinct-SN query disagrees with the shift-metrics denominators")
+        return False
+
+    errors = []
+    for key, true_count in exact.items():
+        estimate = approx.get(key, 0)
+        errors.append(abs(estimate - true_count) / true_count if true_count else 0.0)
+    errors = np.array(errors)
+    print(f"\n[approx] {args.rows:,} rows, {args.days} day(s), {args.uuts} UUT(s), {args.files} file(s)")
+    print(f"  denominators only, exact  (COUNT DISTINCT per UUT x shift): {exact_s:8.3f} s")
+    print(f"  denominators only, approx (HyperLogLog sketches):           {approx_s:8.3f} s  "
+          f"({exact_s / approx_s:.1f}x)")
+    print(f"  full exact shift metrics (+ FPY, final yield, retests):     {full_s:8.3f} s")
+    print(f"  denominators compared: {len(errors)}")
+    mean_pct, max_pct = errors.mean() * 100, errors.max() * 100
+    print(f"  relative error: mean {mean_pct:.2f}%, max {max_pct:.2f}%")
+    if mean_pct > args.max_mean_error or max_pct > args.max_error:
+        print(f"  FAILED: bounds are mean {args.max_mean_error:g}%, max {args.max_error:g}%")
+        return False
+    return True
+
+
+def bench_trend(args, work_dir):
+    """Trend tables and sheets for a long window with many series (timing only, always passes)."""
+    df, start, end = make_synthetic_frame(args.rows, args.trend_days, args.uuts, syndroms=args.syndroms)
+    # Rank by fail rows, like the report's Top N
+    syndroms = df['Syndrom'].value_counts().index[:args.syndroms].tolist()
+    granularities = ('daily', 'weekly', 'monthly', 'shift')
+    compute_s, tables = _best_of(args.repeat, build_trend_tables, df, syndroms, granularities)
+
+    def write_and_save():
+        wb = Workbook()
+        write_trend_sheets(wb, tables)
+        wb.save(os.path.join(work_dir, "trend.xlsx"))
+
+    write_s, _ = _best_of(args.repeat, write_and_save)
+    print(f"\n[trend] {args.rows:,} rows, {args.trend_days} day(s), {len(syndroms)} syndrom(s), "
+          f"sheets: {', '.join(granularities)}")
+    for granularity, table in tables.items():
+        print(f"  {granularity:<8} {len(table['labels']):5d} period(s) x {len(table['series'])} series")
+    print(f"  trend tables (bincount over factorized periods): {compute_s:8.3f} s")
+    print(f"  sheets + charts + save:                          {write_s:8.3f} s")
+    return True
+
+
+def bench_spikes(args, work_dir):
+    """Spike detection: no alarm on stationary data, exactly one on an injected step; False otherwise."""
+    quiet, report_start = make_spike_counts(28, 7, 5, 1, 300, seed=args.spike_seed)
+    stepped, _ = make_spike_counts(28, 7, 5, 1, 300, seed=args.spike_seed, step=(3, 5))
+    false_alarms = detect_spikes(quiet, report_start)
+    alarms = detect_spikes(stepped, report_start)
+    expected = (report_start + timedelta(days=3), 'Syndrom 0', 'UUT 0', '1st Shift')
+    hit = [tuple(row) for row in alarms[['Date', 'Syndrom', 'UUT', 'Shift']].itertuples(index=False)] == [expected]
+
+    # Scale: a year of history for many series, timed; alarms here are the expected 3-sigma noise
+    wide, wide_start = make_spike_counts(358, 7, args.syndroms, args.uuts, 300, seed=args.spike_seed)
+    n_series = wide[~wide['is_total'].astype(bool)].groupby(['Syndrom', 'UUT', 'Shift']).ngroups
+    wide_s, wide_alarms = _best_of(args.repeat, detect_spikes, wide, wide_start)
+    print(f"\n[spikes] stationary: {len(false_alarms)} alarm(s); one-day step x5: {len(alarms)} alarm(s) "
+          f"({'on the injected point' if hit else 'NOT the injected point'})")
+    print(f"  365 day(s) x {n_series} series: {wide_s:8.3f} s, {len(wide_alarms)} alarm(s) "
+          f"on stationary data ({n_series * 7 * 0.00135:.1f} expected at 3 sigma)")
+    if len(false_alarms) or not hit:
+        print("  FAILED: expected no alarm on stationary data and exactly the injected one")
+        return False
+    return True
+
+
+BENCHMARKS = {
+    'approx': bench_approx,
+    'spikes': bench_spikes,
+    'trend': bench_trend,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks on synthetic data (no exports or Outlook needed)")
+    parser.add_argument('benchmarks', nargs='*', metavar='NAME',
+                        help=f"Benchmarks to run (default: all of {', '.join(sorted(BENCHMARKS))})")
+    parser.add_argument('--rows', type=int, default=2_000_000, help="Synthetic test rows (default: 2,000,000)")
+    parser.add_argument('--days', type=int, default=30, help="Days covered by the synthetic data (default: 30)")
+    parser.add_argument('--uuts', type=int, default=8, help="Number of UUTs (default: 8)")
+    parser.add_argument('--files', type=int, default=4, help="Number of synthetic exports (default: 4)")
+    parser.add_argument('--trend-days', type=int, default=365, help="Days covered by the trend benchmark (default: 365)")
+    parser.add_argument('--syndroms', type=int, default=50, help="Syndroms in the trend benchmark (default: 50)")
+    # Fixed data: at 3 sigma about 0.1% of stationary points alarm, so some other seeds flag one
+    parser.add_argument('--spike-seed', type=int, default=1, help="Seed of the spike check data (default: 1)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the best is reported (default: 3)")
+    parser.add_argument('--max-mean-error', type=float, default=APPROX_MAX_MEAN_ERROR, metavar='PCT',
+                        help=f"Fail 'approx' above this mean relative error (default: {APPROX_MAX_MEAN_ERROR:g}%%)")
+    parser.add_argument('--max-error', type=float, default=APPROX_MAX_ERROR, metavar='PCT',
+                        help=f"Fail 'approx' above this max relative error (default: {APPROX_MAX_ERROR:g}%%)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix="tla_bench_")
+    try:
+        failed = [name for name in args.benchmarks or sorted(BENCHMARKS) if not BENCHMARKS[name](args, work_dir)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+    raise SystemExit(1 if failed else 0)
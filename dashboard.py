@@ -0,0 +1,564 @@
+"""
+dashboard.py
+------------
+Local web dashboard over the Parquet cache (no external services).
+
+Serves the Top-N syndroms, per-shift rates, trends and SyndromDB thumbnails
+for any date window, UUT or shift. Query results are kept in an in-process
+LRU cache keyed by the data version (the content hashes of the cached
+exports plus the exclusion file), and every response carries an ETag, so
+repeated views are answered without touching DuckDB or are not re-sent at all.
+
+Run the script from the project root:
+    python dashboard.py                 # http://127.0.0.1:8765/
+    python dashboard.py --port 9000
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, perf_counter
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+from PIL import Image
+
+from generate_daily_report import (
+    EXCLUDE_FILE, TOP_N, TREND_GRANULARITIES, RUN, _exclusion_sql, _load_manifest, _shift_sql, _sql_literals, _sql_path_list,
+    _window_sql, build_rate_table, compute_shift_metrics, ensure_parquet_cache, find_excel_files,
+    get_syndrom_db_info, load_exclusion_rules, load_top_syndroms, syndrom_thumbnail,
+)
+
+DASHBOARD_HOST = "127.0.0.1"
+DASHBOARD_PORT = 8765
+# Query results kept in memory (responses, not raw data)
+QUERY_CACHE_SIZE = 256
+# Seconds between re-scans of the source roots for new or changed exports
+CATALOG_TTL = 30
+# Fallback when syndrom_db_ui.py has not pre-generated the 'report' thumbnail (same size)
+THUMB_SIZE = (160, 120)
+SHIFTS = ('1st Shift', '2nd Shift', 'Unknown')
+
+# ------------------------------------------------------------------
+# Export catalog and data version
+
+class Catalog:
+    """Exports with their date ranges, re-discovered at most every ``ttl`` seconds.
+
+    ``version`` changes whenever an export's content, the set of exports or the
+    exclusion file changes; it is part of every query-cache key and ETag.
+    Discovery caches new exports, which records RUN stages, so it runs under
+    the server's ``query_lock`` like every other RUN user.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL, query_lock=None):
+        self.ttl = ttl
+        self.query_lock = query_lock or threading.Lock()
+        self.file_dates = []
+        # Export -> ESSENTIAL_COLS it lacks (from the cache manifest)
+        self.missing_columns = {}
+        self.version = None
+        self.exclusions = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            if self._checked is not None and monotonic() - self._checked < self.ttl:
+                return self
+            with self.query_lock:
+                file_dates = find_excel_files()
+                del RUN.stages[:]
+            manifest = _load_manifest()
+            digest = hashlib.sha1()
+            missing_columns = {}
+            for info in file_dates:
+                entry = manifest.get(os.path.basename(info['file']), {})
+                digest.update(f"{info['file']}|{entry.get('sha256')}\n".encode())
+                if entry.get('missing_columns'):
+                    missing_columns[info['file']] = entry['missing_columns']
+            if os.path.exists(EXCLUDE_FILE):
+                with open(EXCLUDE_FILE, 'rb') as f:
+                    digest.update(f.read())
+            version = digest.hexdigest()[:16]
+            if version != self.version:
+                self.exclusions = load_exclusion_rules()
+            self.file_dates, self.version, self.missing_columns = file_dates, version, missing_columns
+            self._checked = monotonic()
+            return self
+
+    def files_for(self, start_date, end_date):
+        return [info['file'] for info in self.file_dates
+                if not (info['max_date'] < start_date or info['min_date'] > end_date)]
+
+    def date_span(self):
+        if not self.file_dates:
+            return None, None
+        return (min(info['min_date'] for info in self.file_dates),
+                max(info['max_date'] for info in self.file_dates))
+
+# ------------------------------------------------------------------
+# LRU cache of encoded responses
+
+class QueryCache:
+    """Thread-safe LRU of (body bytes, content type, ETag) by request key."""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, content_type):
+        entry = (body, content_type, '"' + hashlib.sha1(body).hexdigest()[:20] + '"')
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+# ------------------------------------------------------------------
+# Queries (DuckDB over the Parquet cache and the per-day counters)
+
+def _records(df):
+    """DataFrame -> JSON-ready list of dicts (NaN as null, dates as ISO strings)."""
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def _fail_rows_sql(source, where, excluded, syndroms=None):
+    condition = f"{where} AND NOT {excluded} AND lower(SyndromStatus) IS DISTINCT FROM 'pass'"
+    if syndroms is not None:
+        condition += " AND Syndrom IN (SELECT unnest($syndroms))"
+    return (f"SELECT Syndrom, UUT, {_shift_sql()} AS Shift, StartDateTime "
+            f"FROM {source} WHERE {condition}")
+
+
+def _filters_sql(shift=None, uut=None):
+    terms = []
+    if shift:
+        terms.append(f"Shift = {_sql_literals([shift])}")
+    if uut:
+        terms.append(f"UUT = {_sql_literals([uut])}")
+    return " AND ".join(terms) or "TRUE"
+
+
+def query_top(catalog, start_date, end_date, n=TOP_N, shift=None, uut=None):
+    """Top-``n`` syndroms (fail rows) for the window, optionally for one shift and/or UUT.
+
+    Whole-window queries are answered from the per-day counters; a shift
+    filter needs the test timestamps, so those scan the cache itself.
+    """
+    files = catalog.files_for(start_date, end_date)
+    if not shift and not uut:
+        top = load_top_syndroms(start_date, end_date, files, exclusions=catalog.exclusions, n=n)
+    else:
+        parquet_files = ensure_parquet_cache(files)
+        if not parquet_files:
+            return []
+        source = f"read_parquet({_sql_path_list(parquet_files)})"
+        where = _window_sql(start_date, end_date)
+        con = duckdb.connect()
+        excluded = _exclusion_sql(con, source, where, catalog.exclusions) if catalog.exclusions else "FALSE"
+        top = con.execute(f"""
+            SELECT Syndrom, COUNT(*) AS fails FROM ({_fail_rows_sql(source, where, excluded)})
+            WHERE {_filters_sql(shift, uut)} AND Syndrom IS NOT NULL
+            GROUP BY Syndrom ORDER BY fails DESC, Syndrom LIMIT {int(n)}
+        """).df().set_index('Syndrom')['fails']
+        con.close()
+    return [{'rank': i, 'syndrom': s, 'fails': int(f)} for i, (s, f) in enumerate(top.items(), start=1)]
+
+
+def query_rates(catalog, start_date, end_date, syndroms, shift=None, uut=None):
+    """Report rates (fails / unique SNs tested) and yields per syndrom x UUT x shift."""
+    parquet_files = ensure_parquet_cache(catalog.files_for(start_date, end_date))
+    if not parquet_files or not syndroms:
+        return []
+    source = f"read_parquet({_sql_path_list(parquet_files)})"
+    where = _window_sql(start_date, end_date)
+    con = duckdb.connect()
+    excluded = _exclusion_sql(con, source, where, catalog.exclusions) if catalog.exclusions else "FALSE"
+    fail_df = con.execute(
+        f"SELECT * FROM ({_fail_rows_sql(source, where, excluded, syndroms)}) WHERE {_filters_sql(shift, uut)}",
+        {'syndroms': list(syndroms)},
+    ).df()
+    con.close()
+    shift_metrics = compute_shift_metrics(parquet_files, start_date, end_date, exclusions=catalog.exclusions)
+    return _records(build_rate_table(fail_df, list(syndroms), shift_metrics))
+
+
+def query_trend(catalog, start_date, end_date, syndroms, granularity='daily'):
+    """Trend rates (syndrom fail rows / all test rows, %) per day, week, month or day x shift.
+
+    Same definition as the report's trend sheets.
+    """
+    parquet_files = ensure_parquet_cache(catalog.files_for(start_date, end_date))
+    if not parquet_files or not syndroms:
+        return []
+    period = {'daily': "CAST(date_trunc('day', StartDateTime) AS DATE)",
+              'weekly': "CAST(date_trunc('week', StartDateTime) AS DATE)",
+              'monthly': "CAST(date_trunc('month', StartDateTime) AS DATE)",
+              'shift': "CAST(date_trunc('day', StartDateTime) AS DATE)"}[granularity]
+    shift_col = f"{_shift_sql()}" if granularity == 'shift' else "NULL"
+    con = duckdb.connect()
+    trend = con.execute(f"""
+        WITH src AS (
+            SELECT {period} AS Period, {shift_col} AS Shift, Syndrom, SyndromStatus
+            FROM read_parquet({_sql_path_list(parquet_files)}) WHERE {_window_sql(start_date, end_date)}
+        ), totals AS (
+            SELECT Period, Shift, COUNT(*) AS total FROM src GROUP BY ALL
+        ), fails AS (
+            SELECT Period, Shift, Syndrom, COUNT(*) AS fails FROM src
+            WHERE Syndrom IN (SELECT unnest($syndroms)) AND lower(SyndromStatus) IS DISTINCT FROM 'pass'
+            GROUP BY ALL
+        )
+        SELECT t.Period, t.Shift, s.Syndrom, COALESCE(f.fails, 0) AS Fails, t.total AS Total,
+               round(COALESCE(f.fails, 0) * 100.0 / t.total, 2) AS Rate
+        FROM totals t CROSS JOIN (SELECT unnest($syndroms) AS Syndrom) s
+        LEFT JOIN fails f ON f.Period = t.Period AND f.Shift IS NOT DISTINCT FROM t.Shift AND f.Syndrom = s.Syndrom
+        ORDER BY t.Period, t.Shift, s.Syndrom
+    """, {'syndroms': list(syndroms)}).df()
+    con.close()
+    if granularity != 'shift':
+        trend = trend.drop(columns='Shift')
+    return _records(trend.assign(Period=trend['Period'].astype(str)))
+
+
+def render_thumbnail(syndrom, kind):
+    """JPEG thumbnail of a SyndromDB image (None if the syndrom has no such image).
+
+    The pre-generated <syndrom>/thumbs/ report thumbnail is served as is; the
+    image is only decoded and resized when that file is missing or outdated.
+    """
+    golden, defect, _ = get_syndrom_db_info(syndrom)
+    path = golden if kind == 'golden' else defect
+    if not path:
+        return None
+    thumb = syndrom_thumbnail(path, 'report')
+    if thumb:
+        with open(thumb, 'rb') as f:
+            return f.read()
+    with Image.open(path) as img:
+        img = img.convert('RGB')
+        img.thumbnail(THUMB_SIZE)
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=85)
+    return out.getvalue()
+
+# ------------------------------------------------------------------
+# HTTP server
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>TLA Dashboard</title>
+<style>
+ body { font-family: Segoe UI, Arial, sans-serif; margin: 20px; color: #222; }
+ form { margin-bottom: 16px; } label { margin-right: 12px; }
+ table { border-collapse: collapse; margin: 8px 0 20px; }
+ th, td { border: 1px solid #bbb; padding: 4px 8px; text-align: left; }
+ th { background: #4472c4; color: #fff; }
+ img { max-height: 90px; } .meta { color: #777; font-size: 12px; }
+</style></head><body>
+<h2>Daily TLA Dashboard</h2>
+<form id="f">
+ <label>From <input type="date" name="start"></label>
+ <label>To <input type="date" name="end"></label>
+ <label>Shift <select name="shift"><option value="">All</option>
+  <option>1st Shift</option><option>2nd Shift</option><option>Unknown</option></select></label>
+ <label>UUT <input name="uut" size="14"></label>
+ <label>Top <input type="number" name="n" value="3" min="1" max="50" style="width:4em"></label>
+ <label>Trend <select name="granularity"><option>daily</option><option>weekly</option>
+  <option>monthly</option><option>shift</option></select></label>
+ <button>Show</button>
+</form>
+<div class="meta" id="meta"></div>
+<h3>Top syndroms</h3><div id="top"></div>
+<h3>Rates per UUT and shift</h3><div id="rates"></div>
+<h3>Trend (% of test rows)</h3><div id="trend"></div>
+<script>
+const f = document.getElementById('f');
+const esc = s => String(s ?? '').replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c]));
+const pct = v => v == null ? 'N/A' : (v * 100).toFixed(2) + '%';
+function table(rows, cols) {
+  if (!rows.length) return '<p>No data</p>';
+  return '<table><tr>' + cols.map(c => '<th>' + c[0] + '</th>').join('') + '</tr>' +
+    rows.map(r => '<tr>' + cols.map(c => '<td>' + c[1](r) + '</td>').join('') + '</tr>').join('') + '</table>';
+}
+function chart(rows) {
+  const keys = [...new Set(rows.map(r => r.Period + (r.Shift ? ' ' + r.Shift : '')))];
+  const names = [...new Set(rows.map(r => r.Syndrom))];
+  const max = Math.max(1, ...rows.map(r => r.Rate)), w = 900, h = 260;
+  const x = i => 40 + i * (w - 60) / Math.max(1, keys.length - 1), y = v => h - 30 - v * (h - 50) / max;
+  const colors = ['#4472c4', '#ed7d31', '#a5a5a5', '#ffc000', '#5b9bd5', '#70ad47'];
+  let svg = `<svg width="${w}" height="${h}"><text x="4" y="16" font-size="11">${max.toFixed(2)}%</text>`;
+  names.forEach((n, i) => {
+    const pts = rows.filter(r => r.Syndrom === n)
+      .map(r => x(keys.indexOf(r.Period + (r.Shift ? ' ' + r.Shift : ''))) + ',' + y(r.Rate)).join(' ');
+    svg += `<polyline fill="none" stroke-width="2" stroke="${colors[i % colors.length]}" points="${pts}"/>` +
+      `<text x="${w - 300}" y="${16 + i * 14}" font-size="11" fill="${colors[i % colors.length]}">${esc(n)}</text>`;
+  });
+  return svg + `<text x="40" y="${h - 8}" font-size="11">${esc(keys[0])}</text>` +
+    `<text x="${w - 140}" y="${h - 8}" font-size="11">${esc(keys[keys.length - 1])}</text></svg>`;
+}
+async function get(path, params) {
+  const r = await fetch(path + '?' + new URLSearchParams(params));
+  if (!r.ok) throw new Error((await r.json()).error);
+  return r.json();
+}
+async function show(ev) {
+  if (ev) ev.preventDefault();
+  const p = Object.fromEntries([...new FormData(f)].filter(([k, v]) => v));
+  try {
+    const top = await get('/api/top', p);
+    document.getElementById('meta').textContent = `${top.start} to ${top.end} - data version ${top.version}`;
+    document.getElementById('top').innerHTML = table(top.rows, [
+      ['#', r => r.rank], ['Syndrom', r => esc(r.syndrom)], ['Fails', r => r.fails],
+      ['Golden', r => `<img src="/thumb?${new URLSearchParams({syndrom: r.syndrom, kind: 'golden'})}" onerror="this.remove()">`],
+      ['Defect', r => `<img src="/thumb?${new URLSearchParams({syndrom: r.syndrom, kind: 'defect'})}" onerror="this.remove()">`]]);
+    const q = {...p, start: top.start, end: top.end, syndroms: JSON.stringify(top.rows.map(r => r.syndrom))};
+    const [rates, trend] = await Promise.all([get('/api/rates', q), get('/api/trend', q)]);
+    document.getElementById('rates').innerHTML = table(rates.rows, [
+      ['Syndrom', r => esc(r.Syndrom)], ['UUT', r => esc(r.UUT)], ['Shift', r => esc(r.Shift)],
+      ['Fails', r => r.Fails], ['Tested SNs', r => r.Tested],
+      ['Rate', r => r.Rate == null ? 'N/A' : r.Rate.toFixed(2) + '%'],
+      ['First Pass Yield', r => pct(r.FirstPassYield)], ['Final Yield', r => pct(r.FinalYield)],
+      ['Retests', r => r.Retests]]);
+    document.getElementById('trend').innerHTML = trend.rows.length ? chart(trend.rows) : '<p>No data</p>';
+  } catch (e) {
+    document.getElementById('meta').textContent = 'Error: ' + e.message;
+  }
+}
+f.addEventListener('submit', show);
+get('/api/catalog', {}).then(c => { f.start.value = f.end.value = c.max_date || ''; show(); });
+</script></body></html>
+"""
+
+
+class DashboardError(ValueError):
+    """Bad request parameters (answered with HTTP 400)."""
+
+
+def _param_date(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise DashboardError(f"{name} must be YYYY-MM-DD")
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """Routes GET requests; the server carries ``catalog`` and ``cache``."""
+
+    server_version = "TLADashboard/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == '/api/stats':
+            # Cache statistics are live, so never cached themselves
+            return self._send(200, *self._json({'version': self.server.catalog.version,
+                                                'cache': self.server.cache.stats()}))
+        route = ROUTES.get(url.path)
+        if route is None:
+            return self._send(404, *self._json({'error': f"unknown path {url.path}"}))
+        try:
+            catalog = self.server.catalog.refresh()
+            key = (url.path, tuple(sorted(params.items())), catalog.version)
+            entry = self.server.cache.get(key)
+            if entry is None:
+                started = perf_counter()
+                with self.server.query_lock:
+                    body, content_type = route(catalog, params)
+                    # Stage records are only useful per report run; don't let them pile up here
+                    del RUN.stages[:]
+                entry = self.server.cache.put(key, body, content_type)
+                if self.server.verbose:
+                    print(f"  computed {url.path} in {(perf_counter() - started) * 1000:.0f} ms")
+        except DashboardError as e:
+            return self._send(400, *self._json({'error': str(e)}))
+        except LookupError as e:
+            return self._send(404, *self._json({'error': str(e)}))
+        except Exception as e:
+            return self._send(500, *self._json({'error': f"{type(e).__name__}: {e}"}))
+        body, content_type, etag = entry
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, b'', content_type, etag)
+        self._send(200, body, content_type, etag)
+
+    @staticmethod
+    def _json(payload):
+        return json.dumps(payload, default=str).encode('utf-8'), 'application/json'
+
+    def _send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        if etag:
+            self.send_header('ETag', etag)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+
+def _window(catalog, params):
+    first, last = catalog.date_span()
+    if last is None:
+        raise LookupError("no exports found under the source roots")
+    end_date = _param_date(params, 'end', last)
+    start_date = _param_date(params, 'start', end_date)
+    if start_date > end_date:
+        raise DashboardError("start must not be after end")
+    return start_date, end_date
+
+
+def _syndroms(catalog, params, start_date, end_date):
+    if params.get('syndroms'):
+        try:
+            syndroms = json.loads(params['syndroms'])
+        except json.JSONDecodeError:
+            raise DashboardError("syndroms must be a JSON list")
+        if not isinstance(syndroms, list):
+            raise DashboardError("syndroms must be a JSON list")
+        return [str(s) for s in syndroms]
+    top = query_top(catalog, start_date, end_date, _param_int(params, 'n', TOP_N),
+                    params.get('shift'), params.get('uut'))
+    return [row['syndrom'] for row in top]
+
+
+def _param_int(params, name, default):
+    try:
+        return max(1, int(params.get(name, default)))
+    except ValueError:
+        raise DashboardError(f"{name} must be an integer")
+
+
+def _api_payload(catalog, start_date, end_date, rows, **extra):
+    payload = {'start': start_date, 'end': end_date, 'version': catalog.version, 'rows': rows}
+    payload.update(extra)
+    return DashboardHandler._json(payload)
+
+
+def route_index(catalog, params):
+    return DASHBOARD_HTML.encode('utf-8'), 'text/html; charset=utf-8'
+
+
+def route_catalog(catalog, params):
+    first, last = catalog.date_span()
+    return DashboardHandler._json({
+        'version': catalog.version, 'min_date': first, 'max_date': last,
+        'files': [{'file': info['file'], 'min_date': info['min_date'], 'max_date': info['max_date'],
+                   'missing_columns': catalog.missing_columns.get(info['file'], [])}
+                  for info in catalog.file_dates],
+    })
+
+
+def route_top(catalog, params):
+    start_date, end_date = _window(catalog, params)
+    shift = params.get('shift')
+    if shift and shift not in SHIFTS:
+        raise DashboardError(f"shift must be one of {', '.join(SHIFTS)}")
+    rows = query_top(catalog, start_date, end_date, _param_int(params, 'n', TOP_N), shift, params.get('uut'))
+    return _api_payload(catalog, start_date, end_date, rows)
+
+
+def route_rates(catalog, params):
+    start_date, end_date = _window(catalog, params)
+    syndroms = _syndroms(catalog, params, start_date, end_date)
+    rows = query_rates(catalog, start_date, end_date, syndroms, params.get('shift'), params.get('uut'))
+    return _api_payload(catalog, start_date, end_date, rows, syndroms=syndroms)
+
+
+def route_trend(catalog, params):
+    start_date, end_date = _window(catalog, params)
+    granularity = params.get('granularity', 'daily')
+    if granularity not in TREND_GRANULARITIES:
+        raise DashboardError(f"granularity must be one of {', '.join(TREND_GRANULARITIES)}")
+    syndroms = _syndroms(catalog, params, start_date, end_date)
+    rows = query_trend(catalog, start_date, end_date, syndroms, granularity)
+    return _api_payload(catalog, start_date, end_date, rows, syndroms=syndroms, granularity=granularity)
+
+
+def route_thumb(catalog, params):
+    kind = params.get('kind', 'defect')
+    if kind not in ('golden', 'defect') or not params.get('syndrom'):
+        raise DashboardError("thumb needs syndrom=<name> and kind=golden|defect")
+    image = render_thumbnail(params['syndrom'], kind)
+    if image is None:
+        raise LookupError(f"no {kind} image for {params['syndrom']}")
+    return image, 'image/jpeg'
+
+
+ROUTES = {
+    '/': route_index,
+    '/api/catalog': route_catalog,
+    '/api/top': route_top,
+    '/api/rates': route_rates,
+    '/api/trend': route_trend,
+    '/thumb': route_thumb,
+}
+
+
+def make_server(host=DASHBOARD_HOST, port=DASHBOARD_PORT, cache_size=QUERY_CACHE_SIZE, verbose=False):
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    # DuckDB parallelises each query itself; one query at a time keeps memory predictable.
+    # It also guards the shared RUN instrumentation, which catalog discovery uses too.
+    server.query_lock = threading.Lock()
+    server.catalog = Catalog(query_lock=server.query_lock)
+    server.cache = QueryCache(cache_size)
+    server.verbose = verbose
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local web dashboard over the report's Parquet cache")
+    parser.add_argument('--host', default=DASHBOARD_HOST, help=f"Address to bind (default: {DASHBOARD_HOST})")
+    parser.add_argument('--port', type=int, default=DASHBOARD_PORT, help=f"Port (default: {DASHBOARD_PORT})")
+    parser.add_argument('--cache-size', type=int, default=QUERY_CACHE_SIZE,
+                        help=f"Query results kept in memory (default: {QUERY_CACHE_SIZE})")
+    parser.add_argument('--verbose', action='store_true', help="Log every request and query time")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = make_server(args.host, args.port, args.cache_size, args.verbose)
+    print("Scanning exports and refreshing the cache...")
+    server.catalog.refresh()
+    first, last = server.catalog.date_span()
+    print(f"{len(server.catalog.file_dates)} export(s), {first} to {last}")
+    print(f"Dashboard running on http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,9 +1,20 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
+import json
+import argparse
 import concurrent.futures
+import hashlib
+import re
+import math
+import fnmatch
 import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+from contextlib import contextmanager
 from datetime import datetime, time, timedelta
+from time import perf_counter, process_time, sleep
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 from openpyxl.drawing.image import Image as XLImage
@@ -13,8 +24,8 @@ from openpyxl.chart.label import DataLabelList
 import glob
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-import win32com.client
 import tempfile
+import shutil
 import base64
 from PIL import Image
 import io
@@ -24,15 +35,78 @@ SYNDROM_DB = 'SyndromDB'
 REPORT_FILE = 'Daily_TLA_Report.xlsx'
 EXCLUDE_FILE = 'exclude_syndroms.txt'
 RECIPIENTS_FILE = 'recipients.txt'
+SOURCE_ROOTS_FILE = 'source_roots.txt'
 IMG_WIDTH = 80
 IMG_HEIGHT = 60
+# Trend sheets: granularity -> period column, long-format rate column, sheet and chart titles
+TREND_GRANULARITIES = {
+    'daily': {'label': 'Date', 'rate': 'Daily_Rate', 'sheet': 'Daily Trend', 'title': 'Daily Fail Rate Trends'},
+    'weekly': {'label': 'Week', 'rate': 'Weekly_Rate', 'sheet': 'Weekly Trend', 'title': 'Weekly Fail Rate Trends'},
+    'monthly': {'label': 'Month', 'rate': 'Monthly_Rate', 'sheet': 'Monthly Trend', 'title': 'Monthly Fail Rate Trends'},
+    'shift': {'label': 'Shift', 'rate': 'Shift_Rate', 'sheet': 'Shift Trend', 'title': 'Fail Rate Trends per Shift'},
+}
+DEFAULT_TREND_GRANULARITIES = ('daily', 'weekly')
+TREND_SHIFTS = ('1st Shift', '2nd Shift', 'Unknown')
+# Series per chart (wider sets are split over several stacked charts), rows between
+# stacked charts, widest chart (cm) and most category labels on the x axis
+TREND_SERIES_PER_CHART = 10
+TREND_CHART_ROW_SPAN = 32
+TREND_CHART_MAX_WIDTH = 60
+TREND_MAX_AXIS_LABELS = 60
+# Thumbnails pre-generated by syndrom_db_ui.py (<syndrom>/thumbs/<kind>_<purpose>.jpg)
+SYNDROM_THUMB_DIR = 'thumbs'
 # NEW: Only load the columns actually needed from the raw Excel files
 ESSENTIAL_COLS = ['StartDateTime', 'Syndrom', 'SyndromStatus', 'UUT', 'SerialNumber']
 # Folder where per-workbook parquet caches are stored
 PARQUET_CACHE_DIR = "_parquet_cache"
+# Per-workbook copies of the cache sorted by SerialNumber (fast SN history lookups)
+SN_INDEX_DIR = os.path.join(PARQUET_CACHE_DIR, "sn_index")
+SN_INDEX_COLS = ['SerialNumber', 'StartDateTime', 'UUT', 'Syndrom', 'SyndromStatus']
+# Small row groups keep the SerialNumber min/max statistics selective
+SN_INDEX_ROW_GROUP = 8192
+# Per-workbook fail counters (Date x UUT x Syndrom) written at ingestion; Top-N ranking reads only these
+COUNTERS_DIR = os.path.join(PARQUET_CACHE_DIR, "counters")
+# Cache manifest (source stat + content hash per workbook) and cache layout version.
+# Bump CACHE_SCHEMA_VERSION whenever the cached columns/types change.
+CACHE_MANIFEST = os.path.join(PARQUET_CACHE_DIR, "manifest.json")
+CACHE_SCHEMA_VERSION = 2
+CACHE_SCHEMA_KEY = b'tla_cache_schema'
+# Seconds to wait for another run's cache lock, and age after which a lock is considered abandoned
+CACHE_LOCK_TIMEOUT = 300
+CACHE_LOCK_STALE = 900
+# Folder where structured JSON run logs (and optional profiler dumps) are written
+RUN_LOG_DIR = "_run_logs"
+# Source discovery: directory-scan threads, and seconds a file must be unchanged before it is read
+SCAN_WORKERS = 8
+SOURCE_SETTLE_SECONDS = 5
+# Number of syndroms shown in the report
+TOP_N = 3
+# Report columns that need exact per-SN state and are left out in --approx mode
+APPROX_OMITTED_COLS = ['First Pass Yield', 'Final Yield', 'Retests']
+# Partitioned Parquet archive of every report's results (kind=<table>/run_date=<day>/<run id>.parquet)
+REPORT_ARCHIVE_DIR = "_report_archive"
+ARCHIVE_KINDS = ('runs', 'ranking', 'rates', 'rows', 'trend_daily', 'trend_weekly')
+# Fan-out: UUT -> product group mapping file, and the separator ending a UUT's family prefix
+PRODUCT_GROUPS_FILE = "product_groups.txt"
+FANOUT_PREFIX_SEP = " - "
+FANOUT_OTHER_GROUP = "Other"
+# HyperLogLog precision for --approx: 2**14 registers, ~0.8% standard error
+HLL_PRECISION = 14
+# Delta mode: persisted aggregates/high-water mark, and the rate move (percentage points) worth flagging
+DELTA_STATE_DIR = "_delta_state"
+DELTA_RATE_THRESHOLD = 0.5
+# Spike detection: history before the report window used as baseline (days),
+# production days needed before a baseline is trusted, control-limit width (sigmas)
+# and minimum failing SNs for a point to be flagged
+SPIKE_BASELINE_DAYS = 28
+SPIKE_MIN_HISTORY = 5
+SPIKE_SIGMA = 3.0
+SPIKE_MIN_FAILS = 3
 
-# Ensure cache directory exists
+# Ensure cache directories exist
 os.makedirs(PARQUET_CACHE_DIR, exist_ok=True)
+os.makedirs(SN_INDEX_DIR, exist_ok=True)
+os.makedirs(COUNTERS_DIR, exist_ok=True)
 
 # Shift time boundaries
 SHIFT_1_START = time(0, 0)
@@ -61,28 +135,304 @@ def vectorized_shift(series):
         index=series.index
     )
 
-def load_exclude_list():
+# ------------------------------------------------------------------
+# Run instrumentation: per-stage wall/CPU time, peak RSS and row/byte counters
+
+try:
+    import psutil  # optional – reports the true peak working set on Windows
+except ImportError:
+    psutil = None
+
+
+def _peak_rss_mb():
+    """Return the peak resident memory of this process in MB (None if unknown)."""
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        peak = getattr(info, 'peak_wset', None) or info.rss
+        return round(peak / (1024 * 1024), 1)
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is reported in KB on Linux and in bytes on macOS
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_kb /= 1024
+    return round(peak_kb / 1024, 1)
+
+
+class RunInstrumentation:
+    """Collect timing and resource figures for each stage of one report run.
+
+    Stages are opened with ``with RUN.stage('name') as st:`` and may be nested.
+    The yielded dict can be updated with ``rows_in``, ``rows_out`` and
+    ``bytes_read`` while the stage runs. CPU time covers this process only
+    (work done inside worker processes shows up as wall time).
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.params = {}
+        self.stages = []
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name, **counters):
+        record = {'stage': name, 'depth': self._depth,
+                  'rows_in': None, 'rows_out': None, 'bytes_read': None}
+        record.update(counters)
+        self.stages.append(record)
+        self._depth += 1
+        wall_start, cpu_start = perf_counter(), process_time()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._depth -= 1
+            record['wall_s'] = round(perf_counter() - wall_start, 3)
+            record['cpu_s'] = round(process_time() - cpu_start, 3)
+            record['peak_rss_mb'] = _peak_rss_mb()
+
+    def to_dict(self):
+        finished = datetime.now()
+        return {
+            'run_started': self.started.isoformat(timespec='seconds'),
+            'run_finished': finished.isoformat(timespec='seconds'),
+            'total_wall_s': round((finished - self.started).total_seconds(), 3),
+            'peak_rss_mb': _peak_rss_mb(),
+            'params': self.params,
+            'stages': self.stages,
+        }
+
+    def write_log(self, path=None):
+        """Write the structured JSON run log and return its path."""
+        if path is None:
+            os.makedirs(RUN_LOG_DIR, exist_ok=True)
+            path = os.path.join(RUN_LOG_DIR, f"run_{self.started:%Y%m%d_%H%M%S}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+    def print_summary(self):
+        """Print a per-stage summary table to the console."""
+        if not self.stages:
+            return
+        def fmt(value, scale=1, digits=0):
+            return '' if value is None else f"{value / scale:,.{digits}f}"
+        header = f"{'Stage':<32}{'Wall s':>9}{'CPU s':>9}{'Peak MB':>9}{'Rows in':>11}{'Rows out':>11}{'MB read':>9}"
+        print("\n=== Run summary ===")
+        print(header)
+        print("-" * len(header))
+        for rec in self.stages:
+            name = ("  " * rec['depth'] + rec['stage'])[:31]
+            print(f"{name:<32}{fmt(rec.get('wall_s'), digits=2):>9}{fmt(rec.get('cpu_s'), digits=2):>9}"
+                  f"{fmt(rec.get('peak_rss_mb'), digits=1):>9}{fmt(rec['rows_in']):>11}"
+                  f"{fmt(rec['rows_out']):>11}{fmt(rec['bytes_read'], 1024 * 1024, 1):>9}")
+        print("-" * len(header))
+        print(f"Total wall time: {(datetime.now() - self.started).total_seconds():.2f}s")
+
+
+# One collector per process; worker processes get their own (unused) instance
+RUN = RunInstrumentation()
+
+
+def _total_size(paths):
+    """Sum of on-disk sizes for the given files (missing files count as 0)."""
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def run_with_profiler(func, kind, out_base):
+    """Run ``func`` under cProfile or pyinstrument and dump the profile next to the run log."""
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed, falling back to cProfile")
+            kind = 'cprofile'
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                return func()
+            finally:
+                profiler.stop()
+                with open(out_base + '.html', 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+                print(f"Profile written: {out_base}.html")
+
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(out_base + '.prof')
+        print(f"Profile written: {out_base}.prof")
+
+# ------------------------------------------------------------------
+# Exclusion rules (exclude_syndroms.txt)
+#
+# One rule per line. A plain line is an exact syndrom name; a "prefix:",
+# "glob:" or "regex:" marker selects another match type. Optional scopes are
+# appended as " | uut=<glob>", " | from=YYYY-MM-DD", " | to=YYYY-MM-DD".
+
+EXCLUDE_KINDS = ('exact', 'prefix', 'glob', 'regex')
+_SCOPE_SPLIT = re.compile(r"\s+\|\s*(?=(?:uut|from|to)=)")
+
+
+class ExclusionRules:
+    """Compiled exclusion rules.
+
+    Patterns are never evaluated per row: they are matched once against the
+    distinct Syndrom/UUT dictionary of the data being loaded, and the result is
+    turned into IN-lists that DuckDB applies inside the Parquet scan.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        unscoped = [r for r in rules if not self._is_scoped(r)]
+        self._exact = {r['pattern'] for r in unscoped if r['kind'] == 'exact'}
+        self._matchers = self._compile([r for r in unscoped if r['kind'] != 'exact'])
+        self._scoped = [(r, self._compile([r])) for r in rules if self._is_scoped(r)]
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    @staticmethod
+    def _is_scoped(rule):
+        return bool(rule['uut'] or rule['start'] or rule['end'])
+
+    @staticmethod
+    def _compile(rules):
+        """Compile rules into a list of match functions.
+
+        Exact/prefix/glob rules share one anchored regex; each user regex is
+        compiled on its own (searched anywhere in the name) so inline flags
+        such as ``(?i)`` stay at the start of their pattern.
+        """
+        parts, matchers = [], []
+        for rule in rules:
+            kind, pattern = rule['kind'], rule['pattern']
+            if kind == 'exact':
+                parts.append(re.escape(pattern) + r"\Z")
+            elif kind == 'prefix':
+                parts.append(re.escape(pattern))
+            elif kind == 'glob':
+                parts.append(fnmatch.translate(pattern))
+            else:
+                matchers.append(re.compile(pattern, re.DOTALL).search)
+        if parts:
+            matchers.insert(0, re.compile("|".join(f"(?:{p})" for p in parts), re.DOTALL).match)
+        return matchers
+
+    def matches(self, syndrom):
+        """True if an unscoped rule excludes ``syndrom`` everywhere."""
+        if not isinstance(syndrom, str):
+            return False
+        return syndrom in self._exact or any(m(syndrom) for m in self._matchers)
+
+    def excluded_syndroms(self, syndroms):
+        """Subset of the distinct ``syndroms`` dictionary excluded by unscoped rules."""
+        return {s for s in syndroms if self.matches(s)}
+
+    def sql_condition(self, syndroms, uuts):
+        """SQL predicate that is TRUE for excluded rows, given the distinct dictionaries."""
+        terms = []
+        excluded = self.excluded_syndroms(syndroms)
+        if excluded:
+            terms.append(f"Syndrom IN ({_sql_literals(excluded)})")
+        for rule, matchers in self._scoped:
+            names = [s for s in syndroms if isinstance(s, str) and any(m(s) for m in matchers)]
+            if not names:
+                continue
+            clause = [f"Syndrom IN ({_sql_literals(names)})"]
+            if rule['uut']:
+                scoped_uuts = [u for u in uuts if isinstance(u, str) and fnmatch.fnmatchcase(u, rule['uut'])]
+                if not scoped_uuts:
+                    continue
+                clause.append(f"UUT IN ({_sql_literals(scoped_uuts)})")
+            if rule['start']:
+                clause.append(f"StartDateTime >= TIMESTAMP '{pd.Timestamp(rule['start'])}'")
+            if rule['end']:
+                clause.append(f"StartDateTime < TIMESTAMP '{pd.Timestamp(rule['end']) + pd.Timedelta(days=1)}'")
+            terms.append("(" + " AND ".join(clause) + ")")
+        # NULL Syndrom (passing tests) must never count as excluded
+        return f"COALESCE({' OR '.join(terms)}, FALSE)" if terms else "FALSE"
+
+
+def _sql_literals(values):
+    """Render strings as a comma separated list of SQL literals."""
+    return ", ".join("'" + str(v).replace("'", "''") + "'" for v in sorted(values))
+
+
+def _parse_exclusion_line(line):
+    """Parse one exclude_syndroms.txt line into a rule dict (raises ValueError)."""
+    parts = _SCOPE_SPLIT.split(line)
+    body = parts[0].strip()
+    kind, pattern = 'exact', body
+    marker, sep, rest = body.partition(':')
+    # Markers are lower-case only, so a syndrom such as "Regex: ..." stays an exact name
+    if sep and marker.strip() in EXCLUDE_KINDS:
+        kind, pattern = marker.strip(), rest.strip()
+    if not pattern:
+        raise ValueError("empty pattern")
+    if kind == 'regex':
+        re.compile(pattern)
+    rule = {'kind': kind, 'pattern': pattern, 'uut': None, 'start': None, 'end': None}
+    for scope in parts[1:]:
+        key, _, value = scope.strip().partition('=')
+        value = value.strip()
+        if key == 'uut':
+            rule['uut'] = value
+        else:
+            rule['start' if key == 'from' else 'end'] = datetime.strptime(value, '%Y-%m-%d').date()
+    return rule
+
+
+def load_exclusion_rules():
+    """Load and compile the exclusion rules from EXCLUDE_FILE."""
     if not os.path.exists(EXCLUDE_FILE):
-        return set()
+        return ExclusionRules([])
     with open(EXCLUDE_FILE, 'r', encoding='utf-8') as f:
         lines = f.readlines()
-    # Remove comments and whitespace
-    return set(line.strip() for line in lines if line.strip() and not line.strip().startswith('#'))
+    rules = []
+    seen = set()
+    for lineno, line in enumerate(lines, start=1):
+        # Remove comments and whitespace
+        line = line.strip()
+        if not line or line.startswith('#') or line in seen:
+            continue
+        seen.add(line)
+        try:
+            rules.append(_parse_exclusion_line(line))
+        except (ValueError, re.error) as e:
+            print(f"Warning: Ignoring exclusion rule on line {lineno} of {EXCLUDE_FILE} ({e}): {line}")
+    return ExclusionRules(rules)
 
-def merge_consecutive_cells(ws, col_idx):
-    """Merge consecutive cells in a column if they have the same value (except header)."""
+def merge_consecutive_cells(ws, col_idx, key_cols=()):
+    """Merge consecutive cells in a column if they have the same value (except header).
+
+    A run also ends where any of the ``key_cols`` (0-based) changes, so e.g.
+    equal yields of two different syndroms stay separate cells. The key
+    columns must not be merged yet (merged cells read back as None).
+    """
     col_letter = get_column_letter(col_idx + 1)
     start_row = 2  # skip header
     end_row = ws.max_row
-    prev_val = None
+    prev_val = prev_key = None
     merge_start = start_row
     for row in range(start_row, end_row + 1):
         val = ws[f'{col_letter}{row}'].value
-        if val != prev_val:
+        key = tuple(ws.cell(row=row, column=k + 1).value for k in key_cols)
+        if (val, key) != (prev_val, prev_key):
             if row - merge_start > 1 and prev_val is not None:
                 ws.merge_cells(f'{col_letter}{merge_start}:{col_letter}{row-1}')
             merge_start = row
-            prev_val = val
+            prev_val, prev_key = val, key
     # Merge last group
     if end_row - merge_start >= 1 and prev_val is not None:
         ws.merge_cells(f'{col_letter}{merge_start}:{col_letter}{end_row}')
@@ -141,28 +491,202 @@ def get_syndrom_db_info(syndrom):
             description = f.read().strip()
     return golden_img, defect_img, description
 
+def syndrom_thumbnail(image_path, purpose):
+    """Pre-generated 'report' or 'email' thumbnail of a SyndromDB image, or None if missing/outdated."""
+    if not image_path:
+        return None
+    folder, name = os.path.split(image_path)
+    thumb = os.path.join(folder, SYNDROM_THUMB_DIR, f"{os.path.splitext(name)[0]}_{purpose}.jpg")
+    try:
+        return thumb if os.path.getmtime(thumb) >= os.path.getmtime(image_path) else None
+    except OSError:
+        return None
+
+# ------------------------------------------------------------------
+# Source discovery (source_roots.txt) and file catalog
+#
+# Exports can live in several local or mounted folders. Each root is scanned
+# with os.scandir in a thread pool (one task per directory, so deep or slow
+# network trees are walked concurrently). Only stat() data is used here;
+# content hashing happens in the cache layer and only for changed files.
+
+SOURCE_ROOT_KEYS = ('include', 'exclude', 'recursive')
+
+
+def _parse_source_root(line):
+    """Parse ``directory [| include=GLOB;GLOB] [| exclude=GLOB;GLOB] [| recursive=yes|no]``."""
+    parts = re.split(r"\s+\|\s*(?=(?:include|exclude|recursive)=)", line)
+    root = {'path': os.path.normpath(parts[0].strip()), 'include': ['*.xlsx'], 'exclude': [], 'recursive': True}
+    for option in parts[1:]:
+        key, _, value = option.strip().partition('=')
+        if key == 'recursive':
+            root['recursive'] = value.strip().lower() not in ('no', 'false', '0')
+        else:
+            root[key] = [p.strip() for p in value.split(';') if p.strip()]
+    return root
+
+
+def load_source_roots(path=SOURCE_ROOTS_FILE):
+    """Read the configured source roots; without any, the current directory (non-recursive) is used."""
+    default = [{'path': '.', 'include': ['*.xlsx'], 'exclude': [], 'recursive': False}]
+    if not os.path.exists(path):
+        return default
+    roots = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                roots.append(_parse_source_root(line))
+    return roots or default
+
+
+def _scan_dir(path):
+    """List one directory: ([(path, name, stat), ...], [subdirectory entries])."""
+    files, dirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        dirs.append(entry)
+                    elif entry.is_file():
+                        files.append((entry.path, entry.name, entry.stat()))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"Warning: Could not scan {path}: {e}")
+    return files, dirs
+
+
+def _is_generated_file(name):
+    """Report workbooks written by this script (including fan-out outputs) are never inputs."""
+    base, ext = os.path.splitext(REPORT_FILE)
+    return name == REPORT_FILE or fnmatch.fnmatch(name, f"{base}_*{ext}")
+
+
+def _source_file_wanted(root, path, name):
+    if name.startswith('~$') or _is_generated_file(name):
+        return False
+    if not any(fnmatch.fnmatch(name, pattern) for pattern in root['include']):
+        return False
+    rel_path = os.path.relpath(path, root['path']).replace(os.sep, '/')
+    return not any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel_path, p) for p in root['exclude'])
+
+
+def _is_complete_workbook(path, size):
+    """An .xlsx is a zip: a finished file ends with the end-of-central-directory record."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(size - 65557, 0))
+            return b'PK\x05\x06' in f.read()
+    except OSError:
+        return False
+
+
+def discover_source_files(roots=None):
+    """Scan the source roots in parallel; returns {path: os.stat_result} of usable exports.
+
+    Skips Office ``~$`` lock files, this script's own report workbooks, empty
+    files and files still being written (modified in the last
+    SOURCE_SETTLE_SECONDS, or - when their stat differs from the cache
+    manifest - without a zip end record). Exports are keyed by file name in
+    the cache, so the same name under two roots is used once (newest copy).
+    """
+    roots = load_source_roots() if roots is None else roots
+    found = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        pending = {pool.submit(_scan_dir, root['path']): root for root in roots}
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                root = pending.pop(future)
+                files, dirs = future.result()
+                found.extend((root, path, name, st) for path, name, st in files)
+                if root['recursive']:
+                    for entry in dirs:
+                        # Skip hidden folders and this script's own cache/log folders
+                        if entry.name.startswith(('.', '~')) or entry.name in (
+                                PARQUET_CACHE_DIR, RUN_LOG_DIR, DELTA_STATE_DIR):
+                            continue
+                        pending[pool.submit(_scan_dir, entry.path)] = root
+
+    manifest = _load_manifest()
+    now = datetime.now().timestamp()
+    by_name = {}
+    for root, path, name, st in found:
+        if not _source_file_wanted(root, path, name):
+            continue
+        entry = manifest.get(name, {})
+        unchanged = entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns
+        if st.st_size == 0 or (not unchanged and (now - st.st_mtime < SOURCE_SETTLE_SECONDS
+                                                  or not _is_complete_workbook(path, st.st_size))):
+            print(f"Skipping {path} (empty or still being written)")
+            continue
+        path = os.path.normpath(path)
+        previous = by_name.get(name)
+        if previous is not None:
+            keep = (path, st) if st.st_mtime_ns > previous[1].st_mtime_ns else previous
+            print(f"Warning: {name} found in more than one source root; using {keep[0]}")
+            by_name[name] = keep
+        else:
+            by_name[name] = (path, st)
+    return dict(sorted(by_name.values(), key=lambda item: (os.path.basename(item[0]), item[0])))
+
+
+def list_excel_files():
+    """Return the exports found under the source roots (the report workbooks excluded)."""
+    return list(discover_source_files())
+
+
+def _catalog_dates(excel_file, manifest):
+    """(min_date, max_date) of an export from the manifest catalog, filled from its cache if missing."""
+    key = os.path.basename(excel_file)
+    entry = manifest.get(key, {})
+    if 'min_date' not in entry:
+        con = duckdb.connect()
+        min_ts, max_ts = con.execute(
+            f"SELECT min(StartDateTime), max(StartDateTime) FROM read_parquet({_sql_path_list([parquet_cache_path(excel_file)])})"
+        ).fetchone()
+        con.close()
+        entry = dict(entry, min_date=str(min_ts.date()) if min_ts else None,
+                     max_date=str(max_ts.date()) if max_ts else None)
+        _update_manifest(key, entry)
+    if not entry['min_date']:
+        return None, None
+    return (datetime.strptime(entry['min_date'], '%Y-%m-%d').date(),
+            datetime.strptime(entry['max_date'], '%Y-%m-%d').date())
+
+
 def find_excel_files():
-    """Find all Excel files in the current directory and extract their dates."""
-    # Collect *.xlsx files except the report workbook and any temporaries
-    excel_files = [f for f in glob.glob("*.xlsx") if f not in {REPORT_FILE}]
+    """Discover the exports under the source roots and return their date ranges from the catalog.
+
+    New or changed exports are cached first (that pass records their date
+    range in the manifest); unchanged ones are answered from the manifest
+    without opening the workbook.
+    """
+    excel_files = list_excel_files()
+    ensure_parquet_cache(excel_files)
+    manifest = _load_manifest()
     file_dates = []
     
     for file in excel_files:
+        if not os.path.exists(parquet_cache_path(file)):
+            print(f"Warning: Could not read {file}")
+            continue
         try:
-            # Read ONLY the StartDateTime column for min/max extraction
-            df = pd.read_excel(file, usecols=['StartDateTime'])
-            if not df.empty:
-                df['StartDateTime'] = pd.to_datetime(df['StartDateTime'])
-                min_date = df['StartDateTime'].min().date()
-                max_date = df['StartDateTime'].max().date()
-                file_dates.append({
-                    'file': file,
-                    'min_date': min_date,
-                    'max_date': max_date,
-                    'date_range': f"{min_date} to {max_date}"
-                })
+            min_date, max_date = _catalog_dates(file, manifest)
         except Exception as e:
             print(f"Warning: Could not read {file}: {e}")
+            continue
+        if min_date is None:
+            print(f"Warning: {file} has no StartDateTime values")
+            continue
+        file_dates.append({
+            'file': file,
+            'min_date': min_date,
+            'max_date': max_date,
+            'date_range': f"{min_date} to {max_date}"
+        })
     
     return file_dates
 
@@ -227,267 +751,1376 @@ def get_user_date_selection(file_dates, purpose="report"):
             print(f"Invalid input: {e}. Please try again.")
 
 # ------------------------------------------------------------------
-# Helper for parallel reading
-def _read_and_filter(args):
-    """Read an Excel file and return only rows within the date window.
+# DuckDB integration: cache management + fast filtered loading
+#
+# Every cached workbook has an entry in CACHE_MANIFEST recording the source
+# size/mtime and a SHA-256 of its content. A cache is reused when the stat
+# matches, or when the stat changed but the content hash did not; anything
+# else (re-copied export, edited file) triggers a rebuild. The Parquet files
+# also carry CACHE_SCHEMA_VERSION + ESSENTIAL_COLS in their metadata so a
+# code change to the cached shape rebuilds them automatically. Conversions
+# hold a per-file lock and write to a temp file that is atomically renamed,
+# so concurrent runs never read or write a half-finished cache.
 
-    This is a top-level function so it can be pickled for multiprocessing.
-    Parameters
-    ----------
-    args : tuple(file_path, start_date, end_date)
-    """
-    file, start_date, end_date = args
+def parquet_cache_path(excel_file):
+    """Path of the Parquet cache that belongs to an Excel export."""
+    return os.path.join(PARQUET_CACHE_DIR, os.path.basename(excel_file) + ".parquet")
+
+
+def _cache_schema_tag():
+    """Schema fingerprint embedded in every cache file."""
+    return f"v{CACHE_SCHEMA_VERSION}:{','.join(ESSENTIAL_COLS)}"
+
+
+def _file_sha256(path):
+    """Content hash of a file, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_signature(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+@contextmanager
+def _cache_lock(path, timeout=CACHE_LOCK_TIMEOUT):
+    """Cross-process lock implemented as an exclusively created ``<path>.lock`` file."""
+    lock_path = path + ".lock"
+    deadline = perf_counter() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                # A crashed run can leave its lock behind; treat old locks as abandoned
+                if datetime.now().timestamp() - os.path.getmtime(lock_path) > CACHE_LOCK_STALE:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                pass  # lock released meanwhile (or not removable) – retry below
+            if perf_counter() > deadline:
+                raise TimeoutError(f"Timed out waiting for cache lock {lock_path}")
+            sleep(0.2)
     try:
-        import_path = file
-        parquet_path = os.path.join(PARQUET_CACHE_DIR, os.path.basename(file) + ".parquet")
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _atomic_replace(tmp_path, final_path):
+    """Rename ``tmp_path`` over ``final_path``; retries briefly for Windows sharing violations."""
+    for attempt in range(10):
+        try:
+            os.replace(tmp_path, final_path)
+            return
+        except PermissionError:
+            if attempt == 9:
+                raise
+            sleep(0.2)
+
 
-        # Load from parquet cache if up-to-date
-        if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(import_path):
-            df = pd.read_parquet(parquet_path, columns=ESSENTIAL_COLS)
+def _load_manifest():
+    if not os.path.exists(CACHE_MANIFEST):
+        return {}
+    try:
+        with open(CACHE_MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A damaged manifest only costs a re-validation of each cache
+        return {}
+
+
+def _update_manifest(key, entry):
+    """Record (or drop, when ``entry`` is None) one manifest entry under the manifest lock."""
+    with _cache_lock(CACHE_MANIFEST):
+        manifest = _load_manifest()
+        if entry is None:
+            manifest.pop(key, None)
         else:
-            df = pd.read_excel(import_path, usecols=lambda c: c in ESSENTIAL_COLS, parse_dates=['StartDateTime'])
-            # Save to cache for next run
-            try:
-                df.to_parquet(parquet_path, index=False)
-            except Exception:
-                # Skip caching if pyarrow not available
-                pass
-
-        if 'StartDateTime' not in df.columns or df.empty:
-            return None
-
-        mask = (df['StartDateTime'].dt.date >= start_date) & (df['StartDateTime'].dt.date <= end_date)
-        filtered_df = df.loc[mask]
-        if filtered_df.empty:
-            return None
-        return filtered_df
-    except Exception as e:
-        return f"ERROR::{file}::{e}"
+            manifest[key] = entry
+        tmp_path = f"{CACHE_MANIFEST}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        _atomic_replace(tmp_path, CACHE_MANIFEST)
+
+
+def _parquet_schema_tag(parquet_path):
+    """Schema fingerprint stored in a cache file's metadata (None for legacy files)."""
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+    except Exception:
+        return None
+    tag = metadata.get(CACHE_SCHEMA_KEY)
+    return tag.decode() if tag else None
+
+
+def cache_is_fresh(excel_file, manifest=None):
+    """True when the cache for ``excel_file`` matches its content and the current schema."""
+    parquet_path = parquet_cache_path(excel_file)
+    if not os.path.exists(parquet_path):
+        return False
+    manifest = _load_manifest() if manifest is None else manifest
+    key = os.path.basename(excel_file)
+    entry = manifest.get(key)
+    if not entry or entry.get('schema') != _cache_schema_tag():
+        return False
+    if _parquet_schema_tag(parquet_path) != _cache_schema_tag():
+        return False
+    size, mtime_ns = _stat_signature(excel_file)
+    if entry.get('size') == size and entry.get('mtime_ns') == mtime_ns:
+        return True
+    # Stat changed: only the content hash decides (a touched/re-copied identical file is still fresh)
+    if entry.get('size') != size or _file_sha256(excel_file) != entry.get('sha256'):
+        return False
+    _update_manifest(key, dict(entry, size=size, mtime_ns=mtime_ns))
+    return True
+
+
+def _source_schema(df):
+    """Columns and dtypes of a workbook as read, before _normalize_cache_frame() pads and casts them.
+
+    Stored in the manifest so schema checks (analyze_excel.py --profile, the
+    dashboard catalog) see the export itself rather than the normalized cache.
+    """
+    return {
+        'source_columns': {col: str(df[col].dtype) for col in df.columns},
+        'missing_columns': [col for col in ESSENTIAL_COLS if col not in df.columns],
+    }
+
+
+def _normalize_cache_frame(df):
+    """Give the cached frame exactly ESSENTIAL_COLS with stable types across workbooks.
+
+    Missing columns are padded with nulls and every column except
+    StartDateTime is stored as text (numeric SerialNumbers included); the
+    original layout is kept in the manifest, see _source_schema().
+    """
+    for col in ESSENTIAL_COLS:
+        if col not in df.columns:
+            df[col] = None
+    df = df[ESSENTIAL_COLS].copy()
+    df['StartDateTime'] = pd.to_datetime(df['StartDateTime'], errors='coerce')
+    for col in ESSENTIAL_COLS:
+        if col != 'StartDateTime':
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _write_parquet_atomic(df, path, **kwargs):
+    """Write ``df`` (with the cache schema tag in its metadata) via temp file + rename.
+
+    Datetime columns are stored as timestamp[ns], integer columns as int64 and
+    everything else as string, so files of different workbooks share one schema.
+    """
+    schema = pa.schema([
+        pa.field(col, pa.timestamp('ns') if pd.api.types.is_datetime64_any_dtype(df[col])
+                 else pa.int64() if pd.api.types.is_integer_dtype(df[col]) else pa.string())
+        for col in df.columns
+    ])
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[CACHE_SCHEMA_KEY] = _cache_schema_tag().encode()
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        pq.write_table(table, tmp_path, **kwargs)
+        _atomic_replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-# ------------------------------------------------------------------
-# DuckDB integration: cache management + fast filtered loading
 
 def _convert_excel_to_parquet(excel_file, parquet_path):
     """Convert one Excel workbook to Parquet containing only ESSENTIAL_COLS."""
-    df = pd.read_excel(excel_file, usecols=lambda c: c in ESSENTIAL_COLS, parse_dates=['StartDateTime'])
-    if df.empty:
-        return False
-    df.to_parquet(parquet_path, index=False)
+    with _cache_lock(parquet_path):
+        # Another run may have rebuilt this cache while we waited for the lock
+        if cache_is_fresh(excel_file):
+            return True
+        size, mtime_ns = _stat_signature(excel_file)
+        sha256 = _file_sha256(excel_file)
+        df = pd.read_excel(excel_file, usecols=lambda c: c in ESSENTIAL_COLS, parse_dates=['StartDateTime'])
+        if df.empty:
+            return False
+        source_schema = _source_schema(df)
+        if source_schema['missing_columns']:
+            print(f"Warning: {os.path.basename(excel_file)} lacks column(s) "
+                  f"{', '.join(source_schema['missing_columns'])}; cached as empty")
+        df = _normalize_cache_frame(df)
+        _write_parquet_atomic(df, parquet_path)
+        # Build the SerialNumber index and the fail counters while the frame is still in memory
+        _write_sn_index(df, sn_index_path(excel_file))
+        _write_counters(df, counter_path(excel_file))
+        dates = df['StartDateTime'].dropna()
+        _update_manifest(os.path.basename(excel_file), {
+            'source': os.path.abspath(excel_file),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sha256': sha256,
+            'schema': _cache_schema_tag(),
+            'rows': len(df),
+            # Catalog: lets discovery list the date range without opening the workbook
+            'min_date': str(dates.min().date()) if len(dates) else None,
+            'max_date': str(dates.max().date()) if len(dates) else None,
+            'cached_at': datetime.now().isoformat(timespec='seconds'),
+            **source_schema,
+        })
     return True
 
 
 def ensure_parquet_cache(excel_files):
-    """Ensure every XLSX in the list has an up-to-date Parquet cache."""
+    """Ensure every XLSX in the list has an up-to-date Parquet cache.
+
+    Returns the cache paths of the workbooks that have one (in input order).
+    """
+    manifest = _load_manifest()
     outdated = []
     for f in excel_files:
-        parquet_path = os.path.join(PARQUET_CACHE_DIR, os.path.basename(f) + ".parquet")
-        if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(f):
-            outdated.append((f, parquet_path))
+        if not cache_is_fresh(f, manifest):
+            outdated.append((f, parquet_cache_path(f)))
 
-    if not outdated:
-        return
+    if outdated:
+        # Convert sequentially; Excel parsing is heavy but parallel gains are limited by GIL anyway.
+        # We keep it simple; you can switch to ProcessPool if desired.
+        with RUN.stage('excel -> parquet', rows_in=len(outdated)) as st:
+            st['bytes_read'] = _total_size([src for src, _ in outdated])
+            for src, dst in outdated:
+                try:
+                    print(f"Caching {os.path.basename(src)} → parquet …", end=" ")
+                    _convert_excel_to_parquet(src, dst)
+                    print("done")
+                except Exception as e:
+                    print(f"failed ({e})")
 
-    # Convert sequentially; Excel parsing is heavy but parallel gains are limited by GIL anyway.
-    # We keep it simple; you can switch to ProcessPool if desired.
-    for src, dst in outdated:
-        try:
-            print(f"Caching {os.path.basename(src)} → parquet …", end=" ")
-            _convert_excel_to_parquet(src, dst)
-            print("done")
-        except Exception as e:
-            print(f"failed ({e})")
+    return [p for p in (parquet_cache_path(f) for f in excel_files) if os.path.exists(p)]
 
 
-def load_data_duckdb(start_date, end_date, excel_files):
-    """Load filtered data using DuckDB over Parquet caches."""
-    ensure_parquet_cache(excel_files)
+def _shift_sql(col='StartDateTime'):
+    """SQL CASE expression equivalent to vectorized_shift() (same SHIFT_* boundaries)."""
+    t = f"CAST({col} AS TIME)"
+    return (
+        f"CASE WHEN {t} >= TIME '{SHIFT_1_START}' AND {t} < TIME '{SHIFT_1_END}' THEN '1st Shift' "
+        f"WHEN {t} >= TIME '{SHIFT_2_START}' AND {t} <= TIME '{SHIFT_2_END}' THEN '2nd Shift' "
+        "ELSE 'Unknown' END"
+    )
+
 
+def _window_sql(start_date, end_date):
+    """WHERE clause selecting the inclusive [start_date, end_date] day window."""
     start_ts = pd.Timestamp(start_date)
     # Use inclusive <= end
     end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return f"StartDateTime >= '{start_ts}' AND StartDateTime <= '{end_ts}'"
 
-    parquet_glob = os.path.join(PARQUET_CACHE_DIR, "*.parquet")
 
-    con = duckdb.connect()
-    query = (
-        f"SELECT * FROM parquet_scan('{parquet_glob}') "
-        f"WHERE StartDateTime >= '{start_ts}' AND StartDateTime <= '{end_ts}'"
-    )
-    df = con.execute(query).df()
+def _exclusion_sql(con, source, where, exclusions):
+    """Resolve exclusion rules against the window's distinct Syndrom/UUT dictionary."""
+    pairs = con.execute(f"SELECT DISTINCT Syndrom, UUT FROM {source} WHERE {where}").fetchall()
+    syndroms = {s for s, _ in pairs if s is not None}
+    uuts = {u for _, u in pairs if u is not None}
+    return exclusions.sql_condition(syndroms, uuts)
+
+
+def load_data_duckdb(start_date, end_date, excel_files, exclusions=None):
+    """Load filtered data using DuckDB over Parquet caches.
+
+    With ``exclusions`` (an ExclusionRules) the excluded rows are dropped inside
+    the Parquet scan, so they are never materialised in pandas.
+    """
+    # Only scan the caches of the requested workbooks (never orphaned cache files)
+    parquet_files = ensure_parquet_cache(excel_files)
+    if not parquet_files:
+        return None
+
+    source = f"read_parquet({_sql_path_list(parquet_files)})"
+    where = _window_sql(start_date, end_date)
+
+    with RUN.stage('duckdb scan') as st:
+        st['bytes_read'] = _total_size(parquet_files)
+        con = duckdb.connect()
+        if exclusions:
+            where += f" AND NOT {_exclusion_sql(con, source, where, exclusions)}"
+        query = f"SELECT {', '.join(ESSENTIAL_COLS)} FROM {source} WHERE {where}"
+        df = con.execute(query).df()
+        con.close()
+        st['rows_out'] = len(df)
     if df.empty:
         return None
     return df
 
-def load_data_for_date_range(start_date, end_date, files_in_range=None):
-    """Load and combine data from Excel files within the given date range.
+
+def _hll_registers_sql(source, where, group_cols, col='SerialNumber', precision=HLL_PRECISION):
+    """HyperLogLog registers of ``col`` per group: one (group..., reg, rank) row per non-empty register.
+
+    The low ``precision`` bits of DuckDB's 64-bit hash() pick the register, the
+    rank is 1 + the trailing zeros of the remaining bits. Registers of different
+    days/files merge with max(), so they can be combined without rescanning.
+    """
+    rest = f"(hash({col}) >> {precision})::BIGINT"
+    groups = ", ".join(group_cols)
+    return (
+        f"SELECT {groups}, (hash({col}) & {(1 << precision) - 1})::INTEGER AS reg, "
+        f"max(least(bit_count(xor({rest}, {rest} - 1)), {64 - precision + 1})) AS rank "
+        f"FROM {source} WHERE {where} AND {col} IS NOT NULL GROUP BY ALL"
+    )
+
+
+def hll_estimate(ranks):
+    """Distinct-count estimate from a full HLL register array (0 = empty register)."""
+    m = len(ranks)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-ranks))
+    empty = int(np.count_nonzero(ranks == 0))
+    if estimate <= 2.5 * m and empty:
+        # Small-range correction (linear counting)
+        estimate = m * np.log(m / empty)
+    return int(round(estimate))
+
+
+def load_shift_metrics(start_date, end_date, excel_files, exclusions=None, approx=False):
+    """Rate denominators and retest-aware yields for the window's exports (see compute_shift_metrics)."""
+    return compute_shift_metrics(ensure_parquet_cache(excel_files), start_date, end_date,
+                                 exclusions=exclusions, approx=approx)
+
+
+def compute_shift_metrics(parquet_files, start_date, end_date, exclusions=None, approx=False):
+    """Rate denominators and retest-aware yields per UUT x shift (x syndrom) in one DuckDB pass.
+
+    A test is one (SerialNumber, UUT, StartDateTime); it failed if any of its
+    rows is a non-excluded fail. Window functions over each SerialNumber's
+    tests on a UUT give the first and last test, so per UUT x shift (shift of
+    the SN's first test on that UUT):
+
+    * ``sn_totals``   – unique SNs tested (the existing rate denominator)
+    * ``yields``      – first-pass yield and final yield of the SNs first tested there
+    * ``retests``     – per syndrom: SNs that failed with it and were tested again
+
+    Returns a dict with those three lookups plus ``approx``. With
+    ``approx=True`` only ``sn_totals`` is filled, from HyperLogLog sketches
+    (about 0.8% standard error): no per-SN window state or exact distinct
+    sets are built, and yields/retests are left empty.
+    """
+    if not parquet_files:
+        return {'sn_totals': {}, 'yields': {}, 'retests': {}, 'approx': approx}
+    source = f"read_parquet({_sql_path_list(parquet_files)})"
+    where = _window_sql(start_date, end_date)
+    con = duckdb.connect()
+    excluded = _exclusion_sql(con, source, where, exclusions) if exclusions and not approx else "FALSE"
+    metrics = query_shift_metrics(con, source, where, excluded, approx=approx)
+    con.close()
+    return metrics
+
+
+def compute_sn_totals(parquet_files, start_date, end_date, approx=False):
+    """Unique SNs tested per (UUT, Shift) only – the rate denominators of compute_shift_metrics()."""
+    if not parquet_files:
+        return {}
+    con = duckdb.connect()
+    totals = query_sn_totals(con, f"read_parquet({_sql_path_list(parquet_files)})",
+                             _window_sql(start_date, end_date), approx=approx)
+    con.close()
+    return totals
+
+
+def query_sn_totals(con, source, where, approx=False):
+    """{(UUT, Shift): unique SNs} on any DuckDB relation, exact or from HLL sketches."""
+    shifted = f"(SELECT UUT, SerialNumber, StartDateTime, {_shift_sql()} AS Shift FROM {source})"
+    if not approx:
+        with RUN.stage('duckdb exact denominators') as st:
+            rows = con.execute(
+                f"SELECT UUT, Shift, COUNT(DISTINCT SerialNumber) FROM {shifted} "
+                f"WHERE {where} GROUP BY UUT, Shift"
+            ).fetchall()
+            st['rows_out'] = len(rows)
+        return {(uut, shift): sns for uut, shift, sns in rows}
+
+    with RUN.stage('duckdb approx denominators') as st:
+        registers = con.execute(_hll_registers_sql(shifted, where, ['UUT', 'Shift'])).df()
+        st['rows_out'] = len(registers)
+    totals = {}
+    for (uut, shift), group in registers.groupby(['UUT', 'Shift']):
+        ranks = np.zeros(1 << HLL_PRECISION)
+        ranks[group['reg'].to_numpy()] = group['rank'].to_numpy()
+        totals[(uut, shift)] = hll_estimate(ranks)
+    return totals
+
+
+def query_shift_metrics(con, source, where, excluded="FALSE", approx=False):
+    """Run the shift-metrics query of compute_shift_metrics() on any DuckDB relation.
+
+    ``source`` is a table expression with ESSENTIAL_COLS (a Parquet scan or a
+    registered Arrow table) and ``excluded`` a SQL predicate marking excluded rows.
+    """
+    metrics = {'sn_totals': {}, 'yields': {}, 'retests': {}, 'approx': approx}
+    if approx:
+        metrics['sn_totals'] = query_sn_totals(con, source, where, approx=True)
+        return metrics
+
+    with RUN.stage('duckdb shift metrics') as st:
+        query = f"""
+            WITH src AS (
+                SELECT SerialNumber, UUT, Syndrom, StartDateTime, {_shift_sql()} AS Shift,
+                       (lower(SyndromStatus) IS DISTINCT FROM 'pass') AND NOT {excluded} AS is_fail
+                FROM {source} WHERE {where}
+            ), tests AS (
+                SELECT *,
+                       bool_or(is_fail) OVER (PARTITION BY SerialNumber, UUT, StartDateTime) AS test_failed,
+                       dense_rank() OVER (PARTITION BY SerialNumber, UUT ORDER BY StartDateTime) AS test_no
+                FROM src
+            ), ranked AS (
+                SELECT *,
+                       max(test_no) OVER (PARTITION BY SerialNumber, UUT) AS n_tests,
+                       last_value(test_failed) OVER (
+                           PARTITION BY SerialNumber, UUT ORDER BY StartDateTime
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS final_failed
+                FROM tests
+            )
+            SELECT UUT, Shift, Syndrom, GROUPING(Syndrom) AS shift_level,
+                   COUNT(DISTINCT SerialNumber) AS sns,
+                   COUNT(DISTINCT SerialNumber) FILTER (WHERE test_no = 1) AS first_tested,
+                   COUNT(DISTINCT SerialNumber) FILTER (WHERE test_no = 1 AND NOT test_failed) AS first_pass,
+                   COUNT(DISTINCT SerialNumber) FILTER (WHERE test_no = 1 AND NOT final_failed) AS final_pass,
+                   COUNT(DISTINCT SerialNumber) FILTER (WHERE is_fail AND test_no < n_tests) AS retested
+            FROM ranked
+            GROUP BY GROUPING SETS ((UUT, Shift), (UUT, Shift, Syndrom))
+        """
+        rows = con.execute(query).fetchall()
+        st['rows_out'] = len(rows)
+
+    for uut, shift, syndrom, shift_level, sns, first_tested, first_pass, final_pass, retested in rows:
+        if shift_level:
+            metrics['sn_totals'][(uut, shift)] = sns
+            metrics['yields'][(uut, shift)] = {
+                'first_tested': first_tested,
+                'fpy': first_pass / first_tested if first_tested else None,
+                'final_yield': final_pass / first_tested if first_tested else None,
+            }
+        elif syndrom is not None:
+            metrics['retests'][(uut, shift, syndrom)] = retested
+    return metrics
+
+
+def _format_pct(value):
+    """Render a 0..1 fraction as a report percentage ('N/A' when unknown)."""
+    return "N/A" if value is None else f"{value * 100:.2f}%"
+
+# ------------------------------------------------------------------
+# Serial-number history index: SerialNumber-sorted Parquet per workbook
+
+def sn_index_path(excel_file):
+    """Path of the SerialNumber index that belongs to an Excel export."""
+    return os.path.join(SN_INDEX_DIR, os.path.basename(excel_file) + ".parquet")
+
+
+def _write_sn_index(df, index_path):
+    """Write ``df`` sorted by SerialNumber/StartDateTime with small row groups.
+
+    Sorting clusters each SN into one or two row groups, so DuckDB can skip
+    every other row group using the Parquet min/max statistics.
+    """
+    index_df = df[SN_INDEX_COLS].sort_values(['SerialNumber', 'StartDateTime'], kind='stable')
+    _write_parquet_atomic(index_df, index_path, row_group_size=SN_INDEX_ROW_GROUP)
+
+
+def ensure_sn_index(excel_files):
+    """Make sure every workbook has a cache and an SN index at least as new as that cache."""
+    ensure_parquet_cache(excel_files)
+    missing = []
+    for f in excel_files:
+        parquet_path, index_path = parquet_cache_path(f), sn_index_path(f)
+        if not os.path.exists(parquet_path):
+            continue
+        if (not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(parquet_path)
+                or _parquet_schema_tag(index_path) != _cache_schema_tag()):
+            missing.append((parquet_path, index_path))
+    if not missing:
+        return
+    with RUN.stage('build sn index', rows_in=len(missing)) as st:
+        st['bytes_read'] = _total_size([src for src, _ in missing])
+        for parquet_path, index_path in missing:
+            try:
+                with _cache_lock(index_path):
+                    _write_sn_index(pd.read_parquet(parquet_path), index_path)
+            except Exception as e:
+                print(f"Warning: Could not index {parquet_path}: {e}")
+
+
+def _sql_path_list(paths):
+    """Render file paths as a DuckDB list literal for read_parquet([...])."""
+    return "[" + ", ".join("'" + p.replace("'", "''") + "'" for p in paths) + "]"
+
+
+def query_sn_history(serial_numbers, excel_files=None, before=None, fails_only=False):
+    """Return the full test history of the given SNs from the SerialNumber index.
 
     Parameters
     ----------
-    start_date, end_date : datetime.date
-        The inclusive date window.
-    files_in_range : list[str] or None
-        If provided, only these files will be scanned (much faster when caller pre-filters).
+    serial_numbers : iterable[str]
+    excel_files : list[str] or None
+        Restrict the lookup to these exports (default: every indexed export).
+    before : datetime-like or None
+        Only return tests that started before this timestamp.
+    fails_only : bool
+        Only return failed tests (SyndromStatus other than 'pass').
     """
-    all_data = []
-
-    # Decide which files to inspect
-    excel_files = files_in_range if files_in_range is not None else [f for f in glob.glob("*.xlsx") if f not in {REPORT_FILE}]
-
-    # Read files in parallel for speed (I/O + CPU heavy Excel parsing)
-    # NOTE: On Windows we need to be inside the '__main__' guard (which we are)
-    if len(excel_files) > 1:
-        tasks = [(f, start_date, end_date) for f in excel_files]
-        with concurrent.futures.ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as pool:
-            for result in pool.map(_read_and_filter, tasks):
-                if result is None:
-                    continue
-                if isinstance(result, str) and result.startswith("ERROR::"):
-                    _, file, err = result.split("::", 2)
-                    print(f"Warning: Could not read {file}: {err}")
-                    continue
-                all_data.append(result)
+    serial_numbers = sorted({str(sn) for sn in serial_numbers})
+    if excel_files is None:
+        index_files = glob.glob(os.path.join(SN_INDEX_DIR, "*.parquet"))
     else:
-        # Single file: fall back to in-process read (avoids process overhead)
-        for file in excel_files:
-            try:
-                parquet_path = os.path.join(PARQUET_CACHE_DIR, os.path.basename(file) + ".parquet")
-                if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(file):
-                    df = pd.read_parquet(parquet_path, columns=ESSENTIAL_COLS)
-                else:
-                    df = pd.read_excel(file, usecols=lambda c: c in ESSENTIAL_COLS, parse_dates=['StartDateTime'])
-                    try:
-                        df.to_parquet(parquet_path, index=False)
-                    except Exception:
-                        pass
-                if 'StartDateTime' not in df.columns:
-                    continue
-                mask = (df['StartDateTime'].dt.date >= start_date) & (df['StartDateTime'].dt.date <= end_date)
-                filtered_df = df.loc[mask]
-                if not filtered_df.empty:
-                    all_data.append(filtered_df)
-                    print(f"Loaded {len(filtered_df)} records from {file}")
-            except Exception as e:
-                print(f"Warning: Could not read {file}: {e}")
-    
-    if not all_data:
-        print("No data found for the selected date range!")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    print(f"Total records loaded: {len(combined_df)}")
-    return combined_df
-
-def calculate_trend_data(df, top_syndroms):
-    """Calculate daily and weekly trend data for the specified top syndroms."""
-    # Add date column
-    df['Date'] = df['StartDateTime'].dt.date
-    
-    # Calculate daily trends for the specified top syndroms
-    daily_trends = []
+        index_files = [p for p in (sn_index_path(f) for f in excel_files) if os.path.exists(p)]
+    if not serial_numbers or not index_files:
+        return pd.DataFrame(columns=SN_INDEX_COLS)
+
+    # An explicit IN list is pushed into the Parquet scan and prunes row groups by min/max
+    conditions = ["SerialNumber IN (" + ", ".join("?" * len(serial_numbers)) + ")"]
+    params = list(serial_numbers)
+    if before is not None:
+        conditions.append("StartDateTime < ?")
+        params.append(pd.Timestamp(before).to_pydatetime())
+    if fails_only:
+        conditions.append("lower(SyndromStatus) IS DISTINCT FROM 'pass'")
+    query = (
+        f"SELECT DISTINCT {', '.join(SN_INDEX_COLS)} "
+        f"FROM read_parquet({_sql_path_list(index_files)}, union_by_name=true) "
+        f"WHERE {' AND '.join(conditions)} "
+        "ORDER BY SerialNumber, StartDateTime"
+    )
+    with RUN.stage('sn history query', rows_in=len(serial_numbers)) as st:
+        con = duckdb.connect()
+        history = con.execute(query, params).df()
+        con.close()
+        st['rows_out'] = len(history)
+    return history
+
+
+def count_prior_fails(serial_numbers, before, excel_files=None):
+    """Map SerialNumber -> number of failed tests recorded before ``before``.
+
+    ``excel_files`` are exports whose SN index is already up to date (fan-out
+    workers get them from the parent); by default every export is indexed first.
+    """
+    if excel_files is None:
+        excel_files = list_excel_files()
+        ensure_sn_index(excel_files)
+    history = query_sn_history(serial_numbers, excel_files=excel_files, before=before, fails_only=True)
+    if history.empty:
+        return {}
+    # One test can produce several fail rows; count distinct test start times
+    return history.groupby('SerialNumber')['StartDateTime'].nunique().to_dict()
+
+
+def add_prior_fails(report_rows, report_columns, start_date, excel_files=None):
+    """Add the 'Prior Fails' column (fails before the window) to the report rows and columns."""
+    prior = count_prior_fails({row['SN'] for row in report_rows}, before=pd.Timestamp(start_date),
+                              excel_files=excel_files)
+    for row in report_rows:
+        row['Prior Fails'] = prior.get(row['SN'], 0)
+    report_columns.insert(report_columns.index('SN') + 1, 'Prior Fails')
+
+
+def print_sn_history(serial_numbers):
+    """CLI entry point: print the full test history of one or many SNs."""
+    ensure_sn_index(list_excel_files())
+    start = perf_counter()
+    history = query_sn_history(serial_numbers)
+    elapsed_ms = (perf_counter() - start) * 1000
+    if history.empty:
+        print("No test history found for: " + ", ".join(serial_numbers))
+        return history
+    for sn, tests in history.groupby('SerialNumber', sort=True):
+        fails = tests[tests['SyndromStatus'].str.lower() != 'pass']
+        print(f"\n{sn}: {tests['StartDateTime'].nunique()} test(s), {fails['StartDateTime'].nunique()} failed")
+        print(tests[['StartDateTime', 'UUT', 'SyndromStatus', 'Syndrom']].fillna('').to_string(index=False))
+    missing = sorted(set(map(str, serial_numbers)) - set(history['SerialNumber']))
+    if missing:
+        print("\nNo history for: " + ", ".join(missing))
+    print(f"\n{len(history)} row(s) in {elapsed_ms:.0f} ms")
+    return history
+
+# ------------------------------------------------------------------
+# Per-day fail counters (online Top-N)
+#
+# Every cached workbook gets a tiny Date x UUT x Syndrom fail-count table
+# next to its cache. The Top-N for any window is a SUM over those tables, so
+# the ranking (and the preview in main()) needs no raw rows at all.
+
+def counter_path(excel_file):
+    """Path of the per-day fail counters that belong to an Excel export."""
+    return os.path.join(COUNTERS_DIR, os.path.basename(excel_file) + ".parquet")
+
+
+def _write_counters(df, path):
+    """Count fail rows per day, UUT and syndrom (same fail definition as the report)."""
+    fails = df[df['SyndromStatus'].str.lower() != 'pass']
+    counters = (
+        fails.assign(Date=fails['StartDateTime'].dt.normalize())
+        .groupby(['Date', 'UUT', 'Syndrom'], dropna=False).size()
+        .rename('fails').reset_index()
+    )
+    _write_parquet_atomic(counters, path)
+
+
+def ensure_counters(excel_files):
+    """Make sure every cached workbook has counters at least as new as its cache; returns their paths."""
+    ensure_parquet_cache(excel_files)
+    paths, missing = [], []
+    for f in excel_files:
+        parquet_path, path = parquet_cache_path(f), counter_path(f)
+        if not os.path.exists(parquet_path):
+            continue
+        paths.append(path)
+        if (not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(parquet_path)
+                or _parquet_schema_tag(path) != _cache_schema_tag()):
+            missing.append((parquet_path, path))
+    if missing:
+        with RUN.stage('build counters', rows_in=len(missing)) as st:
+            st['bytes_read'] = _total_size([src for src, _ in missing])
+            for parquet_path, path in missing:
+                try:
+                    with _cache_lock(path):
+                        _write_counters(pd.read_parquet(parquet_path), path)
+                except Exception as e:
+                    print(f"Warning: Could not build counters for {parquet_path}: {e}")
+    return [p for p in paths if os.path.exists(p)]
+
+
+def load_top_syndroms(start_date, end_date, excel_files, exclusions=None, n=TOP_N):
+    """Top-``n`` syndroms (all with ``n=None``) by fail count for the window, summed from the per-day counters.
+
+    Exclusion rules are resolved on the counters' Syndrom/UUT dictionary; date
+    scoped rules work because counters are per day. Returns a Series
+    (Syndrom -> fails) sorted by descending count, ties by name.
+    """
+    paths = ensure_counters(excel_files)
+    if not paths:
+        return pd.Series(dtype='int64', name='fails')
+    # Expose the day as StartDateTime so the window and exclusion predicates apply unchanged
+    source = f"(SELECT Date AS StartDateTime, UUT, Syndrom, fails FROM read_parquet({_sql_path_list(paths)}))"
+    where = _window_sql(start_date, end_date)
+    con = duckdb.connect()
+    excluded = _exclusion_sql(con, source, where, exclusions) if exclusions else "FALSE"
+    top = con.execute(f"""
+        SELECT Syndrom, CAST(SUM(fails) AS BIGINT) AS fails FROM {source}
+        WHERE {where} AND NOT {excluded} AND Syndrom IS NOT NULL
+        GROUP BY Syndrom ORDER BY fails DESC, Syndrom {f"LIMIT {int(n)}" if n else ""}
+    """).df()
+    con.close()
+    return top.set_index('Syndrom')['fails']
+
+# ------------------------------------------------------------------
+# Report rows (shared by full and delta runs)
+
+def build_report_rows(fail_df, top_syndroms, shift_metrics):
+    """Build one report row per failed SN of the top syndroms.
+
+    ``fail_df`` holds the non-excluded fail rows (with a Shift column) and
+    ``shift_metrics`` the lookups returned by load_shift_metrics(). Approximate
+    metrics give rates prefixed with '~' and rows without the yield columns.
+    """
+    sn_totals = shift_metrics['sn_totals']
+    approx = shift_metrics.get('approx', False)
+    top_fail_df = fail_df[fail_df['Syndrom'].isin(top_syndroms)]
+    report_rows = []
     for syndrom in top_syndroms:
-        syndrom_fails = df[df['Syndrom'] == syndrom]
-        daily_fails = syndrom_fails.groupby('Date').size()
-        daily_total = df.groupby('Date').size()
-        daily_rate = (daily_fails / daily_total * 100).fillna(0)
-        
-        for date, rate in daily_rate.items():
-            daily_trends.append({
-                'Date': date,
-                'Syndrom': syndrom,
-                'Daily_Rate': round(rate, 2)
-            })
-    
-    daily_df = pd.DataFrame(daily_trends)
-    
-    # Calculate weekly trends for the specified top syndroms
-    df['Week'] = df['StartDateTime'].dt.to_period('W')
-    weekly_trends = []
+        golden_img, defect_img, description = get_syndrom_db_info(syndrom)
+        syndrom_fails = top_fail_df[top_fail_df['Syndrom'] == syndrom]
+        for uut in syndrom_fails['UUT'].unique():
+            uut_df = syndrom_fails[syndrom_fails['UUT'] == uut]
+            for shift in ['1st Shift', '2nd Shift']:
+                shift_fails = uut_df[uut_df['Shift'] == shift]
+                fail_count = len(shift_fails)
+                # Unique SNs for this UUT and shift
+                total_sns_for_shift = sn_totals.get((uut, shift), 0)
+                rate = f"{(fail_count/total_sns_for_shift*100):.2f}%" if total_sns_for_shift > 0 else "N/A"
+                if approx and total_sns_for_shift > 0:
+                    rate = "~" + rate
+                yields = shift_metrics['yields'].get((uut, shift), {})
+                for sn in shift_fails['SerialNumber'].astype(str):
+                    row = {
+                        'Monitor Name': syndrom,
+                        'UUT': uut,
+                        'Shift': shift,
+                        'Rate': rate,
+                        'First Pass Yield': _format_pct(yields.get('fpy')),
+                        'Final Yield': _format_pct(yields.get('final_yield')),
+                        'Retests': shift_metrics['retests'].get((uut, shift, syndrom), 0),
+                        'SN': sn,
+                        'Golden Image': golden_img,
+                        'Defect Image': defect_img,
+                        'Description': description or ''
+                    }
+                    if approx:
+                        for col in APPROX_OMITTED_COLS:
+                            del row[col]
+                    report_rows.append(row)
+    return report_rows
+
+
+def compute_report_rates(fail_df, top_syndroms, sn_totals):
+    """Numeric fail rate (%) per (syndrom, UUT, shift) for the top syndroms."""
+    counts = fail_df[fail_df['Syndrom'].isin(top_syndroms)].groupby(['Syndrom', 'UUT', 'Shift']).size()
+    rates = {}
+    for (syndrom, uut, shift), fails in counts.items():
+        total = sn_totals.get((uut, shift), 0)
+        if total:
+            rates[(syndrom, uut, shift)] = fails / total * 100
+    return rates
+
+# ------------------------------------------------------------------
+# Spike detection (p-chart over every Syndrom x UUT x shift series)
+
+def load_daily_fail_counts(start_date, end_date, excel_files, exclusions=None):
+    """Daily failing SNs per Syndrom x UUT x shift and tested SNs per UUT x shift.
+
+    One DuckDB pass with GROUPING SETS; returns a DataFrame with columns
+    Date, UUT, Shift, Syndrom, is_total, fails, tested. Rows with ``is_total``
+    carry the per-UUT/shift denominators (``tested``).
+    """
+    parquet_files = ensure_parquet_cache(excel_files)
+    if not parquet_files:
+        return pd.DataFrame(columns=['Date', 'UUT', 'Shift', 'Syndrom', 'is_total', 'fails', 'tested'])
+    source = f"read_parquet({_sql_path_list(parquet_files)})"
+    where = _window_sql(start_date, end_date)
+    con = duckdb.connect()
+    excluded = _exclusion_sql(con, source, where, exclusions) if exclusions else "FALSE"
+    counts = con.execute(f"""
+        WITH src AS (
+            SELECT CAST(StartDateTime AS DATE) AS Date, UUT, Syndrom, SerialNumber, {_shift_sql()} AS Shift,
+                   (lower(SyndromStatus) IS DISTINCT FROM 'pass') AND NOT {excluded} AS is_fail
+            FROM {source} WHERE {where}
+        )
+        SELECT Date, UUT, Shift, Syndrom, GROUPING(Syndrom) = 1 AS is_total,
+               COUNT(DISTINCT SerialNumber) FILTER (WHERE is_fail) AS fails,
+               COUNT(DISTINCT SerialNumber) AS tested
+        FROM src
+        GROUP BY GROUPING SETS ((Date, UUT, Shift), (Date, UUT, Shift, Syndrom))
+        HAVING GROUPING(Syndrom) = 1 OR COUNT(*) FILTER (WHERE is_fail) > 0
+    """).df()
+    con.close()
+    return counts
+
+
+def _binomial_sf(k, n, p):
+    """P(X >= k) for X ~ Binomial(n, p), elementwise (meant for the few candidate points)."""
+    sf = np.ones(len(k))
+    for idx, (ki, ni, pi) in enumerate(zip(k.astype(int), n.astype(int), p)):
+        if ki <= 0 or pi >= 1:
+            continue
+        if pi <= 0:
+            sf[idx] = 0.0
+            continue
+        # log pmf(0..k-1) by the ratio pmf(i+1)/pmf(i) = (n-i)/(i+1) * p/(1-p), in logs to avoid underflow
+        i = np.arange(ki - 1)
+        steps = np.log((ni - i) / (i + 1)) + math.log(pi / (1 - pi))
+        log_pmf = ni * math.log1p(-pi) + np.concatenate(([0.0], np.cumsum(steps)))
+        sf[idx] = max(0.0, 1.0 - np.exp(log_pmf).sum())
+    return sf
+
+
+def detect_spikes(counts, report_start, sigma=SPIKE_SIGMA, min_fails=SPIKE_MIN_FAILS,
+                  min_history=SPIKE_MIN_HISTORY):
+    """Flag out-of-control days for every Syndrom x UUT x shift series at once.
+
+    The baseline of each series is its pooled fail fraction over the history
+    before ``report_start`` (total failing SNs / total tested SNs), so it is
+    not pulled along by the days being evaluated. Each day of the report
+    window is compared with the p-chart upper limit
+    ``pbar + sigma * sqrt(pbar * (1 - pbar) / n)`` for that day's ``n`` tested
+    SNs; points above it must also have an exact binomial tail probability
+    no larger than the normal tail at ``sigma``, which keeps low-count series
+    from alarming on noise. All series are laid out as one days x series matrix, so a year of
+    history for thousands of series is a handful of NumPy/pandas operations.
+    Only days with at least ``min_fails`` failing SNs, on series with
+    ``min_history`` production days in the history, are reported. Returns a
+    DataFrame sorted by date and z-score.
+    """
+    columns = ['Date', 'Syndrom', 'UUT', 'Shift', 'Fails', 'Tested', 'Rate', 'Baseline', 'UCL', 'z']
+    if counts.empty:
+        return pd.DataFrame(columns=columns)
+    counts = counts.assign(Date=pd.to_datetime(counts['Date']))
+    days = pd.date_range(counts['Date'].min(), counts['Date'].max(), freq='D')
+    is_total = counts['is_total'].astype(bool)
+    tested = counts[is_total].pivot_table(index='Date', columns=['UUT', 'Shift'], values='tested', aggfunc='sum')
+    fails = counts[~is_total].pivot_table(index='Date', columns=['Syndrom', 'UUT', 'Shift'], values='fails',
+                                         aggfunc='sum', fill_value=0)
+    if fails.empty:
+        return pd.DataFrame(columns=columns)
+    tested = tested.reindex(days)
+    fails = fails.reindex(days, fill_value=0)
+
+    # Denominator of each series = SNs tested on its UUT/shift that day (NaN = no production)
+    series_keys = pd.MultiIndex.from_arrays([fails.columns.get_level_values('UUT'),
+                                             fails.columns.get_level_values('Shift')])
+    n = tested.reindex(columns=series_keys).to_numpy(dtype=float)
+    f = fails.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.where(n > 0, f / n, np.nan)
+
+    # Pooled baseline from the history only; the report window never feeds its own limits
+    in_window = days >= pd.Timestamp(report_start)
+    hist_n = np.nansum(n[~in_window], axis=0)
+    hist_days = (n[~in_window] > 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pbar = np.where(hist_n > 0, f[~in_window].sum(axis=0) / hist_n, np.nan)
+        baseline = np.broadcast_to(pbar, p.shape)
+        spread = np.sqrt(baseline * (1 - baseline) / n)
+        ucl = baseline + sigma * spread
+        z = np.where(spread > 0, (p - baseline) / spread, np.inf)
+    flagged = (p > ucl) & (f >= min_fails) & in_window[:, None] & (hist_days >= min_history)[None, :]
+    # Few failing SNs are far from normal: confirm each candidate with the exact binomial
+    # tail at the same one-sided level as ``sigma``
+    cand_day, cand_series = np.nonzero(flagged)
+    if len(cand_day):
+        tail = _binomial_sf(f[cand_day, cand_series], n[cand_day, cand_series], pbar[cand_series])
+        alpha = 0.5 * math.erfc(sigma / math.sqrt(2))
+        flagged[cand_day[tail > alpha], cand_series[tail > alpha]] = False
+
+    day_idx, series_idx = np.nonzero(flagged)
+    if not len(day_idx):
+        return pd.DataFrame(columns=columns)
+    keys = fails.columns[series_idx]
+    spikes = pd.DataFrame({
+        'Date': days[day_idx].date,
+        'Syndrom': keys.get_level_values('Syndrom'),
+        'UUT': keys.get_level_values('UUT'),
+        'Shift': keys.get_level_values('Shift'),
+        'Fails': f[day_idx, series_idx].astype(int),
+        'Tested': n[day_idx, series_idx].astype(int),
+        'Rate': p[day_idx, series_idx] * 100,
+        'Baseline': baseline[day_idx, series_idx] * 100,
+        'UCL': ucl[day_idx, series_idx] * 100,
+        'z': z[day_idx, series_idx],
+    })
+    return spikes.sort_values(['Date', 'z'], ascending=[True, False], ignore_index=True)
+
+
+def run_spike_detection(args, file_dates, start_date, end_date, exclusions, top_syndroms=()):
+    """Detect spikes in the window over every series (None when --spike-days is 0) and print them."""
+    if args.spike_days <= 0:
+        return None
+    # Every Syndrom x UUT x shift series of the window plus its baseline history, not just the Top N
+    baseline_start = start_date - timedelta(days=args.spike_days)
+    spike_files = [info['file'] for info in file_dates
+                   if not (info['max_date'] < baseline_start or info['min_date'] > end_date)]
+    with RUN.stage('spike detection', rows_in=len(spike_files)) as st:
+        counts = load_daily_fail_counts(baseline_start, end_date, spike_files, exclusions=exclusions)
+        spikes = detect_spikes(counts, start_date, sigma=args.spike_sigma)
+        st['rows_out'] = len(spikes)
+    if not spikes.empty:
+        print(f"\nSpikes (above {args.spike_sigma:g} sigma of the baseline):")
+        for row in spikes.itertuples():
+            marker = "" if not top_syndroms or row.Syndrom in top_syndroms else f" (not in Top {TOP_N})"
+            print(f"  {row.Date} {row.Syndrom} [{row.UUT} / {row.Shift}] "
+                  f"{row.Rate:.2f}% vs baseline {row.Baseline:.2f}%{marker}")
+    else:
+        print("\nNo spikes detected.")
+    return spikes
+
+
+def format_spikes(spikes):
+    """Spike table for the report sheet and email (rates as percentages)."""
+    table = spikes.rename(columns={'Syndrom': 'Monitor Name', 'Fails': 'Failed SNs', 'Tested': 'Tested SNs'})
+    for col in ('Rate', 'Baseline', 'UCL'):
+        table[col] = table[col].map(lambda v: f"{v:.2f}%")
+    return table.drop(columns='z')
+
+# ------------------------------------------------------------------
+# Delta mode: incremental aggregates persisted between runs
+#
+# DELTA_STATE_DIR keeps the window start, a high-water mark (latest ingested
+# StartDateTime), the content fingerprint of every export already ingested
+# and the previous Top-N/rates, plus three small Parquet aggregates:
+#   fails     – non-excluded fail rows (SN lists and Top-N counts)
+#   sn_seen   – distinct (UUT, Shift, SerialNumber) (rate denominators)
+#   sn_tests  – first/last test per (SerialNumber, UUT) (yields and retests)
+# A delta run only reads rows at or after the high-water mark from exports
+# whose fingerprint changed; rows at the mark itself are de-duplicated on
+# (SerialNumber, StartDateTime, Syndrom). Exports are assumed to append in
+# time: rows back-filled before the mark are counted per export and
+# reported, but need a full (non-delta) run to be included.
+
+DELTA_FRAMES = ('fails', 'sn_seen', 'sn_tests')
+
+
+def _delta_path(name):
+    return os.path.join(DELTA_STATE_DIR, name)
+
+
+def _exclusion_fingerprint():
+    """Hash of the exclusion file; a changed rule set invalidates the delta state."""
+    return _file_sha256(EXCLUDE_FILE) if os.path.exists(EXCLUDE_FILE) else None
+
+
+def _empty_delta_frames():
+    return {
+        'fails': pd.DataFrame({'StartDateTime': pd.Series(dtype='datetime64[ns]'), 'Syndrom': pd.Series(dtype=object),
+                               'UUT': pd.Series(dtype=object), 'Shift': pd.Series(dtype=object),
+                               'SerialNumber': pd.Series(dtype=object)}),
+        'sn_seen': pd.DataFrame(columns=['UUT', 'Shift', 'SerialNumber']),
+        'sn_tests': pd.DataFrame(columns=['SerialNumber', 'UUT', 'first_ts', 'first_shift', 'first_failed',
+                                          'last_ts', 'last_failed', 'n_tests']),
+    }
+
+
+def load_delta_state():
+    """Return (state dict, frames dict) from DELTA_STATE_DIR, or (None, None)."""
+    try:
+        with open(_delta_path('state.json'), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        frames = {name: pd.read_parquet(_delta_path(f"{name}.parquet")) for name in DELTA_FRAMES}
+    except (OSError, ValueError):
+        return None, None
+    return state, frames
+
+
+def save_delta_state(state, frames):
+    """Persist the delta state atomically (Parquet frames first, then state.json)."""
+    os.makedirs(DELTA_STATE_DIR, exist_ok=True)
+    state_path = _delta_path('state.json')
+    with _cache_lock(state_path):
+        for name in DELTA_FRAMES:
+            path = _delta_path(f"{name}.parquet")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            frames[name].to_parquet(tmp_path, index=False)
+            _atomic_replace(tmp_path, path)
+        tmp_path = f"{state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=1, default=str)
+        _atomic_replace(tmp_path, state_path)
+
+
+def _merge_sn_tests(old, new_rows):
+    """Fold newly ingested rows into the per-(SerialNumber, UUT) first/last test table."""
+    tests = (
+        new_rows.groupby(['SerialNumber', 'UUT', 'StartDateTime'], as_index=False)
+        .agg(failed=('is_fail', 'any'), Shift=('Shift', 'first'))
+        .sort_values('StartDateTime', kind='stable')
+    )
+    grouped = tests.groupby(['SerialNumber', 'UUT'], sort=False)
+    new = pd.DataFrame({
+        'first_ts': grouped['StartDateTime'].first(),
+        'first_shift': grouped['Shift'].first(),
+        'first_failed': grouped['failed'].first(),
+        'last_ts': grouped['StartDateTime'].last(),
+        'last_failed': grouped['failed'].last(),
+        'n_tests': grouped.size(),
+    }).reset_index()
+    if old.empty:
+        return new
+    # New rows are at or after the high-water mark, so "old then new" is chronological.
+    # A new test at the old last timestamp is the rest of that test, not another one.
+    key = ['SerialNumber', 'UUT']
+    old, new = old.set_index(key), new.set_index(key)
+    common = old.index.intersection(new.index)
+    before, after = old.loc[common], new.loc[common]
+    continues = after['first_ts'] == before['last_ts']
+    merged = before.assign(
+        first_failed=before['first_failed'].astype(bool)
+        | ((after['first_ts'] == before['first_ts']) & after['first_failed'].astype(bool)),
+        last_ts=after['last_ts'],
+        last_failed=after['last_failed'].astype(bool)
+        | ((after['last_ts'] == before['last_ts']) & before['last_failed'].astype(bool)),
+        n_tests=before['n_tests'] + after['n_tests'] - continues.astype(int),
+    )
+    return pd.concat([old.drop(common), merged, new.drop(common)]).reset_index()
+
+
+def delta_shift_metrics(frames):
+    """Same lookups as load_shift_metrics(), derived from the persisted delta aggregates."""
+    metrics = {'sn_totals': {}, 'yields': {}, 'retests': {}}
+    metrics['sn_totals'] = frames['sn_seen'].groupby(['UUT', 'Shift']).size().to_dict()
+    sn_tests = frames['sn_tests']
+    if not sn_tests.empty:
+        per_shift = sn_tests.assign(
+            first_pass=~sn_tests['first_failed'].astype(bool), final_pass=~sn_tests['last_failed'].astype(bool)
+        ).groupby(['UUT', 'first_shift']).agg(
+            first_tested=('SerialNumber', 'size'), first_pass=('first_pass', 'sum'), final_pass=('final_pass', 'sum'))
+        for (uut, shift), row in per_shift.iterrows():
+            metrics['yields'][(uut, shift)] = {
+                'first_tested': int(row['first_tested']),
+                'fpy': row['first_pass'] / row['first_tested'],
+                'final_yield': row['final_pass'] / row['first_tested'],
+            }
+        # A fail row was retested when the SN has a later test on the same UUT
+        fails = frames['fails'].merge(sn_tests[['SerialNumber', 'UUT', 'last_ts']], on=['SerialNumber', 'UUT'])
+        retested = fails[fails['StartDateTime'] < fails['last_ts']]
+        metrics['retests'] = retested.groupby(['UUT', 'Shift', 'Syndrom'])['SerialNumber'].nunique().to_dict()
+    return metrics
+
+
+def _mark_keys(rows):
+    """(SerialNumber, Syndrom) of ``rows`` as strings: the de-duplication key at the high-water mark."""
+    return pd.MultiIndex.from_arrays([rows[col].fillna('').astype(str) for col in ('SerialNumber', 'Syndrom')])
+
+
+def _count_backfilled(changed, excel_files, parquet_files, start_date, end_date, hwm, state):
+    """Window rows that appeared in ``changed`` below the previous high-water mark; updates ``file_rows``.
+
+    ``state['file_rows']`` remembers, per export, the mark after its last scan
+    and how many window rows it held below (``before``) and up to (``upto``)
+    that mark. Rows older than ``hwm`` beyond those counts are back-filled.
+    """
+    names = {p: os.path.basename(f) for f, p in zip(excel_files, parquet_files)}
+    mark = state['high_water_mark']
+    older = f"StartDateTime < '{hwm}'" if hwm is not None else "FALSE"
+    con = duckdb.connect()
+    rows = con.execute(
+        f"SELECT filename, count(*) FILTER (WHERE {older}), count(*) FILTER (WHERE StartDateTime < '{mark}'), "
+        f"count(*) FILTER (WHERE StartDateTime <= '{mark}') "
+        f"FROM read_parquet({_sql_path_list(changed)}, filename=true) "
+        f"WHERE {_window_sql(start_date, end_date)} GROUP BY filename"
+    ).fetchall()
+    con.close()
+    file_rows = state['file_rows']
+    skipped = 0
+    for path, older_now, before, upto in rows:
+        name = names.get(path, os.path.basename(path))
+        last = file_rows.get(name)
+        if hwm is not None:
+            if last is None:
+                older_then = 0
+            elif last['mark'] == str(hwm):
+                older_then = last['before']
+            else:
+                # Every row of the last scan was at or below its (earlier) mark
+                older_then = last['upto']
+            skipped += max(older_now - older_then, 0)
+        file_rows[name] = {'mark': mark, 'before': before, 'upto': upto}
+    return skipped
+
+
+def update_delta_state(start_date, end_date, excel_files, exclusions):
+    """Ingest only what is new since the previous delta run and return the updated aggregates.
+
+    Returns a dict with ``fail_df``, ``shift_metrics``, the ``previous`` Top-N
+    and rates, and the ``state``/``frames`` to persist with finish_delta_run().
+    """
+    parquet_files = ensure_parquet_cache(excel_files)
+    manifest = _load_manifest()
+    fingerprints = {os.path.basename(f): manifest.get(os.path.basename(f), {}).get('sha256') for f in excel_files}
+
+    state, frames = load_delta_state()
+    rules_key = _exclusion_fingerprint()
+    hwm = pd.Timestamp(state['high_water_mark']) if state and state.get('high_water_mark') else None
+    if (state is None or state.get('window_start') != str(start_date) or state.get('rules') != rules_key
+            or state.get('schema') != _cache_schema_tag() or not state.get('window_end')
+            or 'file_rows' not in state
+            or (hwm is not None and hwm.date() > end_date)):
+        print("Delta: no reusable state for this window, rebuilding aggregates")
+        # 'top' is None until a delta run has reported; there is nothing to compare with then
+        previous = {'top': (state or {}).get('top'), 'rates': (state or {}).get('rates', {})}
+        state = {'window_start': str(start_date), 'rules': rules_key, 'schema': _cache_schema_tag(),
+                 'window_end': str(end_date), 'high_water_mark': None, 'mark_rows': [], 'files': {},
+                 'file_rows': {}}
+        frames = _empty_delta_frames()
+        hwm = None
+    else:
+        previous = {'top': state.get('top'), 'rates': state.get('rates', {})}
+
+    if end_date > datetime.strptime(state['window_end'], '%Y-%m-%d').date():
+        # Unchanged exports may still hold rows past the old window end that were never read
+        changed = list(parquet_files)
+    else:
+        changed = [p for f, p in zip(excel_files, parquet_files)
+                   if fingerprints.get(os.path.basename(f)) != state['files'].get(os.path.basename(f))]
+    new_rows = pd.DataFrame()
+    backfilled = 0
+    if changed:
+        source = f"read_parquet({_sql_path_list(changed)})"
+        where = _window_sql(start_date, end_date)
+        if hwm is not None:
+            where += f" AND StartDateTime >= '{hwm}'"
+        with RUN.stage('delta scan', rows_in=len(changed)) as st:
+            st['bytes_read'] = _total_size(changed)
+            con = duckdb.connect()
+            excluded = _exclusion_sql(con, source, where, exclusions) if exclusions else "FALSE"
+            new_rows = con.execute(
+                f"SELECT StartDateTime, Syndrom, UUT, SerialNumber, {_shift_sql()} AS Shift, "
+                f"(lower(SyndromStatus) IS DISTINCT FROM 'pass') AND NOT {excluded} AS is_fail "
+                f"FROM {source} WHERE {where} ORDER BY StartDateTime"
+            ).df()
+            con.close()
+            if hwm is not None and not new_rows.empty:
+                # Rows at the mark may have been ingested already from an earlier export version
+                seen = [tuple(k) for k in state['mark_rows']]
+                if seen:
+                    new_rows = new_rows[~((new_rows['StartDateTime'] == hwm) & _mark_keys(new_rows).isin(seen))]
+            st['rows_out'] = len(new_rows)
+
+    if not new_rows.empty:
+        fails = new_rows.loc[new_rows['is_fail'], ['StartDateTime', 'Syndrom', 'UUT', 'Shift', 'SerialNumber']]
+        frames['fails'] = pd.concat([frames['fails'], fails], ignore_index=True)
+        frames['sn_seen'] = pd.concat(
+            [frames['sn_seen'], new_rows[['UUT', 'Shift', 'SerialNumber']]], ignore_index=True
+        ).drop_duplicates(ignore_index=True)
+        frames['sn_tests'] = _merge_sn_tests(frames['sn_tests'], new_rows)
+        new_hwm = new_rows['StartDateTime'].max()
+        if hwm is None or new_hwm > hwm:
+            state['high_water_mark'], state['mark_rows'] = str(new_hwm), []
+        at_mark = new_rows[new_rows['StartDateTime'] == pd.Timestamp(state['high_water_mark'])]
+        state['mark_rows'] = state['mark_rows'] + [list(k) for k in _mark_keys(at_mark)]
+
+    if changed and state['high_water_mark']:
+        backfilled = _count_backfilled(changed, excel_files, parquet_files, start_date, end_date, hwm, state)
+
+    state['files'].update({k: v for k, v in fingerprints.items() if v})
+    state['window_end'] = str(end_date)
+    print(f"Delta: {len(new_rows)} new row(s) from {len(changed)} changed export(s); "
+          f"high-water mark {state['high_water_mark']}")
+    if backfilled:
+        print(f"Warning: skipped {backfilled} back-filled row(s) older than the previous high-water mark; "
+              f"run once without --delta to include them")
+    return {
+        'fail_df': frames['fails'],
+        'shift_metrics': delta_shift_metrics(frames),
+        'previous': previous,
+        'state': state,
+        'frames': frames,
+    }
+
+
+def finish_delta_run(delta, top_syndroms, rates, threshold=DELTA_RATE_THRESHOLD):
+    """Persist the new state and return the change list against the previous report.
+
+    Returns None when no earlier delta run reported a ranking to compare with.
+    """
+    state = delta['state']
+    state['top'] = list(top_syndroms)
+    # JSON keys must be strings; \x1f never appears in syndrom/UUT names
+    state['rates'] = {'\x1f'.join(k): v for k, v in rates.items()}
+    state['updated'] = datetime.now().isoformat(timespec='seconds')
+    save_delta_state(state, delta['frames'])
+
+    prev_top = delta['previous']['top']
+    if prev_top is None:
+        return None
+    prev_rates = {tuple(k.split('\x1f')): v for k, v in delta['previous']['rates'].items()}
+    changes = []
     for syndrom in top_syndroms:
-        syndrom_fails = df[df['Syndrom'] == syndrom]
-        weekly_fails = syndrom_fails.groupby('Week').size()
-        weekly_total = df.groupby('Week').size()
-        weekly_rate = (weekly_fails / weekly_total * 100).fillna(0)
-        
-        for week, rate in weekly_rate.items():
-            weekly_trends.append({
-                'Week': week,
-                'Syndrom': syndrom,
-                'Weekly_Rate': round(rate, 2)
-            })
-    
-    weekly_df = pd.DataFrame(weekly_trends)
-    
-    return daily_df, weekly_df
+        if syndrom not in prev_top:
+            changes.append({'Change': f'Entered Top {TOP_N}', 'Monitor Name': syndrom,
+                            'UUT': '', 'Shift': '', 'Previous Rate': '', 'Rate': ''})
+    for syndrom in prev_top:
+        if syndrom not in top_syndroms:
+            changes.append({'Change': f'Left Top {TOP_N}', 'Monitor Name': syndrom,
+                            'UUT': '', 'Shift': '', 'Previous Rate': '', 'Rate': ''})
+    for key, rate in sorted(rates.items()):
+        before = prev_rates.get(key)
+        if before is not None and abs(rate - before) >= threshold:
+            syndrom, uut, shift = key
+            changes.append({'Change': 'Rate up' if rate > before else 'Rate down', 'Monitor Name': syndrom,
+                            'UUT': uut, 'Shift': shift, 'Previous Rate': f"{before:.2f}%", 'Rate': f"{rate:.2f}%"})
+    return changes
+
+# ------------------------------------------------------------------
+# Report workbook
+
+def report_columns_for(shift_metrics):
+    """Columns of the Top N sheet for the given metrics (approximate mode has no yields)."""
+    columns = ['Monitor Name', 'UUT', 'Shift', 'Rate', 'First Pass Yield', 'Final Yield', 'Retests',
+               'SN', 'Golden Image', 'Defect Image', 'Description']
+    if shift_metrics.get('approx'):
+        columns = [c for c in columns if c not in APPROX_OMITTED_COLS]
+    return columns
+
+
+def write_report_workbook(report_file, report_df, report_rows, report_columns, approx=False,
+                          changes=None, spikes=None):
+    """Write the Top N sheet (images, merged cells) and optional Changes/Spikes sheets.
+
+    Returns the open openpyxl workbook so trend sheets can be added before saving.
+    """
+    with pd.ExcelWriter(report_file, engine='openpyxl') as writer:
+        report_df.rename(columns={'Rate': 'Rate (approx.)'} if approx else {}).to_excel(
+            writer, index=False, sheet_name='Top 3 Syndroms')
+
+    # Now add images using openpyxl
+    wb = load_workbook(report_file)
+    ws = wb['Top 3 Syndroms']
+    # Merge and insert images per unique syndrom
+    create_merged_image_and_description_cells(ws, report_rows, syndrom_col=1,
+                                              golden_img_col=report_columns.index('Golden Image') + 1,
+                                              defect_img_col=report_columns.index('Defect Image') + 1,
+                                              desc_col=report_columns.index('Description') + 1)
+    # Merge cells for Monitor Name, UUT, Shift, Rate and the yield columns,
+    # each within the run of the columns to its left (same syndrom, UUT, shift).
+    # Right to left, so the columns used as keys are still unmerged.
+    for col_idx in reversed(range(report_columns.index('SN'))):
+        merge_consecutive_cells(ws, col_idx, key_cols=range(col_idx))
+    if changes:
+        changes_ws = wb.create_sheet("Changes")
+        changes_ws.append(list(changes[0].keys()))
+        for change in changes:
+            changes_ws.append(list(change.values()))
+    if spikes is not None and not spikes.empty:
+        spikes_ws = wb.create_sheet("Spikes")
+        spike_table = format_spikes(spikes)
+        spikes_ws.append(list(spike_table.columns))
+        for values in spike_table.itertuples(index=False):
+            spikes_ws.append(list(values))
+    return wb
+
+# ------------------------------------------------------------------
+# Trend sheets: period x syndrom rate matrices for any granularity
+#
+# Rates are rows of a syndrom / all rows of the period (%). The matrix is
+# counted with one bincount over factorized period and syndrom codes, written
+# to the sheet row by row from the NumPy array, and charted with at most
+# TREND_SERIES_PER_CHART series per chart.
+
+def _trend_shift_codes(timestamps):
+    """Index into TREND_SHIFTS per timestamp; same boundaries as vectorized_shift(), without time objects."""
+    offsets = (timestamps - timestamps.dt.floor('D')).to_numpy().astype('timedelta64[ns]')
+
+    def at(t):
+        return np.timedelta64(timedelta(hours=t.hour, minutes=t.minute, seconds=t.second,
+                                        microseconds=t.microsecond), 'ns')
+
+    first = (offsets >= at(SHIFT_1_START)) & (offsets < at(SHIFT_1_END))
+    # vectorized_shift() compares microsecond-resolution times against SHIFT_2_END
+    second = (offsets >= at(SHIFT_2_START)) & (offsets < at(SHIFT_2_END) + np.timedelta64(1000, 'ns'))
+    return np.where(first, 0, np.where(second, 1, 2))
+
+
+def _trend_period_codes(day_codes, days, timestamps, granularity):
+    """Map rows to period codes (-1 for NaT); returns (codes, sorted period labels).
+
+    ``day_codes``/``days`` are the factorized calendar days of ``timestamps``;
+    every granularity is derived from the few distinct days, except the shift
+    split which also needs the time of day.
+    """
+    valid = day_codes >= 0
+    day_labels = np.asarray(days.strftime('%Y-%m-%d'), dtype=object)
+    if granularity == 'shift':
+        n_shifts = len(TREND_SHIFTS)
+        keys = day_codes.astype(np.int64) * n_shifts + _trend_shift_codes(timestamps)
+        uniques = np.unique(keys[valid])
+        labels = np.array([f"{day_labels[k // n_shifts]} {TREND_SHIFTS[k % n_shifts]}" for k in uniques], dtype=object)
+        codes = np.full(len(keys), -1, dtype=np.int64)
+        codes[valid] = np.searchsorted(uniques, keys[valid])
+        return codes, labels
+    if granularity != 'daily':
+        day_labels = np.asarray(days.to_period('W' if granularity == 'weekly' else 'M').astype(str), dtype=object)
+    labels, day_to_period = np.unique(day_labels, return_inverse=True)
+    codes = np.where(valid, day_to_period[day_codes], -1) if len(labels) else day_codes
+    return codes, labels
+
+
+def build_trend_tables(df, syndroms, granularities=DEFAULT_TREND_GRANULARITIES):
+    """Fail rate (%) of each syndrom per period, one table per granularity (see TREND_GRANULARITIES).
 
-def create_trend_charts(wb, daily_df, weekly_df, top_syndroms):
-    """Create trend charts and add to Excel workbook."""
+    Each table is a dict with ``granularity``, ``labels`` (sorted period
+    labels), ``series`` (the syndroms, in the given order) and ``values`` (a
+    periods x series float array rounded to 2 decimals). Days and syndroms
+    are factorized once and shared by every granularity.
+    """
+    timestamps = df['StartDateTime']
+    day_codes, days = pd.factorize(timestamps.dt.floor('D'), sort=True)
+    series = list(dict.fromkeys(syndroms))
+    series_codes = pd.Index(series).get_indexer(df['Syndrom'])
+    n_series = len(series)
+    tables = {}
+    for granularity in granularities:
+        codes, labels = _trend_period_codes(day_codes, days, timestamps, granularity)
+        n_periods = len(labels)
+        valid = codes >= 0
+        totals = np.bincount(codes[valid], minlength=n_periods)
+        hits = valid & (series_codes >= 0)
+        fails = np.bincount(codes[hits] * n_series + series_codes[hits],
+                            minlength=n_periods * n_series).reshape(n_periods, n_series)
+        # Every period has at least one row, so totals are never 0
+        values = np.round(fails / np.maximum(totals, 1)[:, None] * 100, 2)
+        tables[granularity] = {'granularity': granularity, 'labels': list(labels), 'series': series, 'values': values}
+    return tables
+
+
+def trend_long(table):
+    """Long (period, Syndrom, rate) frame of a trend table, as used by the e-mail charts and the archive.
+
+    Daily tables give ``Date``/``Daily_Rate`` (dates as datetime.date), weekly
+    ones ``Week``/``Weekly_Rate`` and so on; None gives an empty frame.
+    """
+    if table is None:
+        return pd.DataFrame()
+    spec = TREND_GRANULARITIES[table['granularity']]
+    n_periods, n_series = table['values'].shape
+    periods = np.tile(np.asarray(table['labels'], dtype=object), n_series)
+    if table['granularity'] == 'daily':
+        periods = pd.to_datetime(periods).date
+    return pd.DataFrame({
+        spec['label']: periods,
+        'Syndrom': np.repeat(np.asarray(table['series'], dtype=object), n_periods),
+        spec['rate']: table['values'].T.ravel(),
+    })
+
+
+def _trend_chart(title, x_title, n_categories, width):
+    """Line chart with the report's trend styling (shared by every trend sheet)."""
     from openpyxl.chart.axis import ChartLines
-    # Pivot daily data: rows=Date, columns=Syndrom, values=Daily_Rate
-    daily_pivot = daily_df.pivot(index='Date', columns='Syndrom', values='Daily_Rate').fillna(0)
-    daily_ws = wb.create_sheet("Daily Trend")
-    # Write header
-    daily_ws.append(["Date"] + list(daily_pivot.columns))
-    # Write data (convert dates to strings for Excel category axis)
-    for date, row in daily_pivot.iterrows():
-        daily_ws.append([str(date)] + [row.get(s, 0) for s in daily_pivot.columns])
-    # Create LineChart for daily trend
-    daily_chart = LineChart()
-    daily_chart.title = "Daily Fail Rate Trends"
-    daily_chart.x_axis.title = "Date"
-    daily_chart.y_axis.title = "Fail Rate (%)"
-    daily_chart.height = 15
-    daily_chart.width = 20
-    data = Reference(daily_ws, min_col=2, min_row=1, max_col=1+len(daily_pivot.columns), max_row=1+len(daily_pivot))
-    cats = Reference(daily_ws, min_col=1, min_row=2, max_row=1+len(daily_pivot))
-    daily_chart.add_data(data, titles_from_data=True)
-    daily_chart.set_categories(cats)
-    # Explicitly enable axes and tick labels
-    daily_chart.x_axis.majorTickMark = "in"
-    daily_chart.y_axis.majorTickMark = "in"
-    daily_chart.x_axis.tickLblPos = "nextTo"
-    daily_chart.y_axis.tickLblPos = "nextTo"
-    daily_chart.x_axis.crosses = "autoZero"
-    daily_chart.y_axis.crosses = "autoZero"
-    daily_chart.x_axis.majorGridlines = ChartLines()
-    daily_chart.y_axis.majorGridlines = ChartLines()
-    # Enable data labels for each series
-    for ser in daily_chart.series:
-        ser.dLbls = None  # Remove data labels for clarity, or set to DataLabelList() to enable
-    daily_ws.add_chart(daily_chart, f"{get_column_letter(2+len(daily_pivot.columns))}2")
-
-    # Pivot weekly data: rows=Week, columns=Syndrom, values=Weekly_Rate
-    weekly_pivot = weekly_df.pivot(index='Week', columns='Syndrom', values='Weekly_Rate').fillna(0)
-    weekly_ws = wb.create_sheet("Weekly Trend")
-    # Write header
-    weekly_ws.append(["Week"] + list(weekly_pivot.columns))
-    # Write data (convert weeks to strings for Excel category axis)
-    for week, row in weekly_pivot.iterrows():
-        weekly_ws.append([str(week)] + [row.get(s, 0) for s in weekly_pivot.columns])
-    # Create LineChart for weekly trend
-    weekly_chart = LineChart()
-    weekly_chart.title = "Weekly Fail Rate Trends"
-    weekly_chart.x_axis.title = "Week"
-    weekly_chart.y_axis.title = "Fail Rate (%)"
-    weekly_chart.height = 15
-    weekly_chart.width = 20
-    data = Reference(weekly_ws, min_col=2, min_row=1, max_col=1+len(weekly_pivot.columns), max_row=1+len(weekly_pivot))
-    cats = Reference(weekly_ws, min_col=1, min_row=2, max_row=1+len(weekly_pivot))
-    weekly_chart.add_data(data, titles_from_data=True)
-    weekly_chart.set_categories(cats)
+    chart = LineChart()
+    chart.title = title
+    chart.x_axis.title = x_title
+    chart.y_axis.title = "Fail Rate (%)"
+    chart.height = 15
+    chart.width = width
     # Explicitly enable axes and tick labels
-    weekly_chart.x_axis.majorTickMark = "in"
-    weekly_chart.y_axis.majorTickMark = "in"
-    weekly_chart.x_axis.tickLblPos = "nextTo"
-    weekly_chart.y_axis.tickLblPos = "nextTo"
-    weekly_chart.x_axis.crosses = "autoZero"
-    weekly_chart.y_axis.crosses = "autoZero"
-    weekly_chart.x_axis.majorGridlines = ChartLines()
-    weekly_chart.y_axis.majorGridlines = ChartLines()
-    # Enable data labels for each series
-    for ser in weekly_chart.series:
-        ser.dLbls = None  # Remove data labels for clarity, or set to DataLabelList() to enable
-    weekly_ws.add_chart(weekly_chart, f"{get_column_letter(2+len(weekly_pivot.columns))}2")
+    chart.x_axis.majorTickMark = "in"
+    chart.y_axis.majorTickMark = "in"
+    chart.x_axis.tickLblPos = "nextTo"
+    chart.y_axis.tickLblPos = "nextTo"
+    chart.x_axis.crosses = "autoZero"
+    chart.y_axis.crosses = "autoZero"
+    chart.x_axis.majorGridlines = ChartLines()
+    chart.y_axis.majorGridlines = ChartLines()
+    # Long windows: label every n-th category only
+    skip = -(-n_categories // TREND_MAX_AXIS_LABELS)
+    if skip > 1:
+        chart.x_axis.tickLblSkip = skip
+        chart.x_axis.tickMarkSkip = skip
+    return chart
+
+
+def write_trend_sheet(wb, table):
+    """Add the sheet of one trend table: period x syndrom matrix plus its line chart(s)."""
+    spec = TREND_GRANULARITIES[table['granularity']]
+    labels, series = table['labels'], table['series']
+    ws = wb.create_sheet(spec['sheet'])
+    ws.append([spec['label']] + series)
+    # tolist() converts the whole matrix to Python floats in one call
+    for label, row in zip(labels, table['values'].tolist()):
+        ws.append([label] + row)
+    if not labels or not series:
+        return ws
+
+    n_rows = len(labels)
+    width = min(TREND_CHART_MAX_WIDTH, max(20, n_rows * 0.15))
+    categories = Reference(ws, min_col=1, min_row=2, max_row=1 + n_rows)
+    anchor_col = get_column_letter(2 + len(series))
+    chunks = range(0, len(series), TREND_SERIES_PER_CHART)
+    for i, first in enumerate(chunks):
+        last = min(first + TREND_SERIES_PER_CHART, len(series))
+        title = spec['title'] if len(chunks) == 1 else f"{spec['title']} ({first + 1}-{last} of {len(series)})"
+        chart = _trend_chart(title, spec['label'], n_rows, width)
+        chart.add_data(Reference(ws, min_col=2 + first, max_col=1 + last, min_row=1, max_row=1 + n_rows),
+                       titles_from_data=True)
+        chart.set_categories(categories)
+        ws.add_chart(chart, f"{anchor_col}{2 + i * TREND_CHART_ROW_SPAN}")
+    return ws
+
+
+def write_trend_sheets(wb, tables):
+    """Add one trend sheet per table (in TREND_GRANULARITIES order)."""
+    for granularity in TREND_GRANULARITIES:
+        if granularity in tables:
+            write_trend_sheet(wb, tables[granularity])
 
 def create_merged_image_and_description_cells(ws, report_rows, syndrom_col, golden_img_col, defect_img_col, desc_col):
     from openpyxl.utils import get_column_letter
@@ -510,13 +2143,14 @@ def create_merged_image_and_description_cells(ws, report_rows, syndrom_col, gold
         golden_img = report_rows[first_row-2]['Golden Image']
         defect_img = report_rows[first_row-2]['Defect Image']
         description = report_rows[first_row-2]['Description']
+        # Small pre-generated thumbnails keep the workbook light; originals otherwise
         if golden_img:
-            img = XLImage(golden_img)
+            img = XLImage(syndrom_thumbnail(golden_img, 'report') or golden_img)
             img.width = 80
             img.height = 60
             ws.add_image(img, f'{get_column_letter(golden_img_col)}{first_row}')
         if defect_img:
-            img = XLImage(defect_img)
+            img = XLImage(syndrom_thumbnail(defect_img, 'report') or defect_img)
             img.width = 80
             img.height = 60
             ws.add_image(img, f'{get_column_letter(defect_img_col)}{first_row}')
@@ -526,13 +2160,13 @@ def create_merged_image_and_description_cells(ws, report_rows, syndrom_col, gold
         ws[f'{get_column_letter(golden_img_col)}{first_row}'].value = None
         ws[f'{get_column_letter(defect_img_col)}{first_row}'].value = None
 
-def load_recipients():
+def load_recipients(path=RECIPIENTS_FILE):
     """Load email recipients from recipients.txt file."""
-    if not os.path.exists(RECIPIENTS_FILE):
-        print(f"Warning: {RECIPIENTS_FILE} not found. No email will be sent.")
+    if not os.path.exists(path):
+        print(f"Warning: {path} not found. No email will be sent.")
         return []
     
-    with open(RECIPIENTS_FILE, 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         lines = f.readlines()
     
     # Remove comments and whitespace, filter valid email addresses
@@ -544,8 +2178,11 @@ def load_recipients():
     
     return recipients
 
-def generate_chart_images(daily_df, weekly_df, top_syndroms, start_date, end_date):
-    """Generate trend charts as PNG images for email embedding."""
+def generate_chart_images(daily_df, weekly_df, top_syndroms, start_date, end_date, file_prefix=""):
+    """Generate trend charts as PNG images for email embedding.
+
+    ``file_prefix`` keeps the files of concurrently built reports apart.
+    """
     chart_files = []
     
     # Set up matplotlib style
@@ -570,7 +2207,7 @@ def generate_chart_images(daily_df, weekly_df, top_syndroms, start_date, end_dat
         plt.xticks(rotation=45)
         plt.tight_layout()
         
-        daily_chart_file = 'daily_trend_chart.png'
+        daily_chart_file = f'{file_prefix}daily_trend_chart.png'
         plt.savefig(daily_chart_file, dpi=300, bbox_inches='tight')
         plt.close()
         chart_files.append(daily_chart_file)
@@ -592,7 +2229,7 @@ def generate_chart_images(daily_df, weekly_df, top_syndroms, start_date, end_dat
         plt.xticks(rotation=45)
         plt.tight_layout()
         
-        weekly_chart_file = 'weekly_trend_chart.png'
+        weekly_chart_file = f'{file_prefix}weekly_trend_chart.png'
         plt.savefig(weekly_chart_file, dpi=300, bbox_inches='tight')
         plt.close()
         chart_files.append(weekly_chart_file)
@@ -615,16 +2252,32 @@ def create_email_summary_table(report_rows):
                 'UUT': uut,
                 '1st Shift': '',
                 '2nd Shift': '',
+                'FPY / Final (1st)': '',
+                'FPY / Final (2nd)': '',
+                'Retests': 0,
                 'Golden Image': row['Golden Image'],
                 'Defect Image': row['Defect Image'],
                 'Description': row['Description']
             }
+        yields = f"{row.get('First Pass Yield', 'N/A')} / {row.get('Final Yield', 'N/A')}"
         if shift == '1st Shift':
             summary_data[key]['1st Shift'] = rate
+            summary_data[key]['FPY / Final (1st)'] = yields
         elif shift == '2nd Shift':
             summary_data[key]['2nd Shift'] = rate
+            summary_data[key]['FPY / Final (2nd)'] = yields
+        # Report rows repeat per SN, so count each (UUT, shift) retest figure once
+        seen_shifts = summary_data[key].setdefault('_shifts', set())
+        if shift not in seen_shifts:
+            seen_shifts.add(shift)
+            summary_data[key]['Retests'] += row.get('Retests', 0)
+    for entry in summary_data.values():
+        entry.pop('_shifts', None)
     # Convert to DataFrame
     summary_df = pd.DataFrame(list(summary_data.values()))
+    if report_rows and 'First Pass Yield' not in report_rows[0]:
+        # Approximate mode: no yields or retests were computed
+        summary_df = summary_df.drop(columns=['FPY / Final (1st)', 'FPY / Final (2nd)', 'Retests'])
     return summary_df
 
 def create_html_table(df):
@@ -643,7 +2296,13 @@ def create_html_table(df):
         for col in df.columns:
             if col in ['Golden Image', 'Defect Image']:
                 img_path = row[col]
-                if isinstance(img_path, str) and os.path.exists(img_path):
+                thumb_path = syndrom_thumbnail(img_path, 'email') if isinstance(img_path, str) else None
+                if thumb_path:
+                    # Already a 400x400 JPEG (generated when the syndrom was imported)
+                    with open(thumb_path, 'rb') as f:
+                        img_data = base64.b64encode(f.read()).decode('utf-8')
+                    html += f'<td style="padding: 8px; border: 1px solid #ddd; width:400px; height:400px; text-align:center;"><img src="data:image/jpeg;base64,{img_data}" style="width:400px; height:400px;" /></td>'
+                elif isinstance(img_path, str) and os.path.exists(img_path):
                     try:
                         # Open and resize image to exactly 400x400 pixels
                         with Image.open(img_path) as img:
@@ -671,29 +2330,37 @@ def create_html_table(df):
     html += '</table>'
     return html
 
-def send_email_with_charts(recipients, chart_files, html_table, start_date, end_date):
-    """Send Outlook email with embedded charts and table."""
+def send_email_with_charts(recipients, chart_files, html_table, start_date, end_date, extra_sections=None,
+                           title="Daily TLA Report"):
+    """Send Outlook email with embedded charts and table.
+
+    ``extra_sections`` is an optional list of (heading, html) blocks placed after the summary table;
+    ``title`` is used for the subject and the heading (fan-out adds the group name).
+    """
     try:
+        # Imported lazily so the data helpers can be reused on machines without Outlook/pywin32
+        import win32com.client
         # Create Outlook application object
         outlook = win32com.client.Dispatch("Outlook.Application")
         mail = outlook.CreateItem(0)  # 0 = olMailItem
         
         # Set email properties
-        mail.Subject = f"Daily TLA Report - {start_date} to {end_date}"
+        mail.Subject = f"{title} - {start_date} to {end_date}"
         mail.To = "; ".join(recipients)
         
         # Create HTML body
         html_body = f"""
         <html>
         <body style="font-family: Arial, sans-serif; margin: 20px;">
-            <h2 style="color: #333;">Daily TLA Report</h2>
+            <h2 style="color: #333;">{title}</h2>
             <p><strong>Date Range:</strong> {start_date} to {end_date}</p>
             
             <h3 style="color: #555; margin-top: 30px;">Top 3 Syndroms Summary</h3>
             {html_table}
-            
-            <h3 style="color: #555; margin-top: 30px;">Trend Charts</h3>
         """
+        for heading, section_html in extra_sections or []:
+            html_body += f'<h3 style="color: #555; margin-top: 30px;">{heading}</h3>{section_html}'
+        html_body += '<h3 style="color: #555; margin-top: 30px;">Trend Charts</h3>'
         
         # Add chart images
         for chart_file in chart_files:
@@ -731,11 +2398,417 @@ def send_email_with_charts(recipients, chart_files, html_table, start_date, end_
             if os.path.exists(chart_file):
                 os.remove(chart_file)
 
-def main():
+# ------------------------------------------------------------------
+# Results archive: every run's computed tables as partitioned Parquet
+#
+# Layout: REPORT_ARCHIVE_DIR/kind=<table>/run_date=<YYYY-MM-DD>/<run id>.parquet,
+# where the run id is the run start time (to the microsecond), suffixed with
+# the group tag for fan-out reports. Every table has a product_group column
+# (empty for whole-line reports). Tables:
+#   runs          one row per run (window, Top-N, parameters)
+#   ranking       every syndrom's fail count and rank in the window
+#   rates         per Top-N syndrom x UUT x shift: fails, tested SNs, rate, yields, retests
+#   rows          the report rows (SN level, without images)
+#   trend_daily / trend_weekly   trend tables when trend sheets were generated
+
+def build_rate_table(fail_df, top_syndroms, shift_metrics):
+    """Numeric per (syndrom, UUT, shift) figures behind the report's Rate/yield columns."""
+    top = fail_df[fail_df['Syndrom'].isin(top_syndroms)]
+    table = top.groupby(['Syndrom', 'UUT', 'Shift']).size().rename('Fails').reset_index()
+    keys = list(zip(table['UUT'], table['Shift']))
+    yields = [shift_metrics['yields'].get(key, {}) for key in keys]
+    table['Tested'] = [shift_metrics['sn_totals'].get(key, 0) for key in keys]
+    table['Rate'] = (table['Fails'] / table['Tested'].where(table['Tested'] > 0) * 100).astype(float)
+    table['FirstPassYield'] = [y.get('fpy') for y in yields]
+    table['FinalYield'] = [y.get('final_yield') for y in yields]
+    table['Retests'] = [shift_metrics['retests'].get((u, sh, sy), 0)
+                        for sy, u, sh in zip(table['Syndrom'], table['UUT'], table['Shift'])]
+    table['Rank'] = table['Syndrom'].map({s: i for i, s in enumerate(top_syndroms, start=1)})
+    table['Approx'] = bool(shift_metrics.get('approx', False))
+    return table.sort_values(['Rank', 'UUT', 'Shift'], ignore_index=True)
+
+
+def _archive_write(kind, run_id, run_date, df):
+    part_dir = os.path.join(REPORT_ARCHIVE_DIR, f"kind={kind}", f"run_date={run_date}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, f"{run_id}.parquet")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    _atomic_replace(tmp_path, path)
+
+
+def archive_report_results(start_date, end_date, ranking, report_rows, rate_table,
+                           daily_df=None, weekly_df=None, params=None, group=None):
+    """Append this run's results (or one fan-out group's) to the Parquet archive; returns the run id."""
+    run_id = f"{RUN.started:%Y%m%d_%H%M%S_%f}"
+    if group is not None:
+        run_id += f"_{_group_file_tag(group)}"
+    common = {'run_id': run_id, 'product_group': group,
+              'window_start': pd.Timestamp(start_date), 'window_end': pd.Timestamp(end_date)}
+    tables = {
+        'runs': pd.DataFrame([{
+            'created': pd.Timestamp(RUN.started),
+            'top': list(ranking.index[:TOP_N]),
+            'params': json.dumps(params or {}, default=str),
+        }]),
+        'ranking': pd.DataFrame({'Syndrom': ranking.index, 'Fails': ranking.to_numpy(),
+                                 'Rank': np.arange(1, len(ranking) + 1)}),
+        'rates': rate_table,
+        'rows': pd.DataFrame(report_rows).drop(columns=['Golden Image', 'Defect Image', 'Description'],
+                                               errors='ignore').astype(str),
+    }
+    if daily_df is not None and not daily_df.empty:
+        tables['trend_daily'] = daily_df.assign(Date=pd.to_datetime(daily_df['Date']))
+    if weekly_df is not None and not weekly_df.empty:
+        tables['trend_weekly'] = weekly_df.assign(Week=weekly_df['Week'].astype(str))
+    for kind, df in tables.items():
+        if not df.empty:
+            _archive_write(kind, run_id, f"{RUN.started:%Y-%m-%d}",
+                           df.assign(**common).astype({'product_group': 'string'}))
+    return run_id
+
+
+def query_archive(sql):
+    """Run ``sql`` over the archive; every kind is available as a view of the same name."""
+    con = duckdb.connect()
+    for kind in ARCHIVE_KINDS:
+        pattern = os.path.join(REPORT_ARCHIVE_DIR, f"kind={kind}", "*", "*.parquet")
+        if glob.glob(pattern):
+            con.execute(f"CREATE VIEW {kind} AS SELECT * FROM read_parquet({_sql_path_list([pattern])}, "
+                        f"hive_partitioning=true, union_by_name=true)")
+    try:
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+
+def archive_has_runs():
+    """True when at least one run is archived; prints a hint otherwise."""
+    if glob.glob(os.path.join(REPORT_ARCHIVE_DIR, "kind=runs", "*", "*.parquet")):
+        return True
+    print(f"No archived reports in {REPORT_ARCHIVE_DIR}/ yet.")
+    return False
+
+
+def print_archive_rank(syndrom, last=60):
+    """CLI entry point: rank and fail count of one syndrom over the last ``last`` archived reports."""
+    if not archive_has_runs():
+        return None
+    start = perf_counter()
+    history = query_archive(f"""
+        SELECT r.run_id, strftime(r.window_start, '%Y-%m-%d') AS window_start,
+               strftime(r.window_end, '%Y-%m-%d') AS window_end,
+               k.Rank, k.Fails
+        FROM runs r LEFT JOIN ranking k ON k.run_id = r.run_id AND k.Syndrom = '{syndrom.replace("'", "''")}'
+        WHERE r.product_group IS NULL
+        ORDER BY r.run_id DESC LIMIT {int(last)}
+    """)
+    elapsed_ms = (perf_counter() - start) * 1000
+    print(f"\n{syndrom}: last {len(history)} archived report(s)")
+    print(history.astype(object).fillna('-').to_string(index=False))
+    print(f"\n{len(history)} report(s) in {elapsed_ms:.0f} ms")
+    return history
+
+# ------------------------------------------------------------------
+# Fan-out: one report per product group from a single load
+#
+# The window is scanned once into an Arrow IPC file (with the exclusion flag
+# already evaluated). Worker processes memory-map that file, slice out their
+# group's UUTs and build the group's workbook, trend sheets and email HTML;
+# only the parent talks to Outlook.
+
+def load_product_groups(path=PRODUCT_GROUPS_FILE):
+    """Read ``UUT glob = group`` lines (first match wins); '#' starts a comment."""
+    if not os.path.exists(path):
+        print(f"Warning: {path} not found. Every UUT goes to '{FANOUT_OTHER_GROUP}'.")
+        return []
+    mapping = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            pattern, sep, group = line.rpartition('=')
+            if not sep or not pattern.strip() or not group.strip():
+                print(f"Warning: {path}:{line_no}: expected 'UUT glob = group', skipped")
+                continue
+            mapping.append((pattern.strip(), group.strip()))
+    return mapping
+
+
+def group_uuts(uuts, mode, mapping=None):
+    """Partition UUT names into {group: [uut, ...]} for ``mode`` 'uut', 'uut-prefix' or 'map'."""
+    groups = {}
+    for uut in sorted(u for u in uuts if isinstance(u, str)):
+        if mode == 'uut':
+            group = uut
+        elif mode == 'uut-prefix':
+            group = uut.split(FANOUT_PREFIX_SEP, 1)[0].strip() or uut
+        else:
+            group = next((g for pattern, g in mapping or [] if fnmatch.fnmatchcase(uut, pattern)), FANOUT_OTHER_GROUP)
+        groups.setdefault(group, []).append(uut)
+    return groups
+
+
+def _group_file_tag(group):
+    """File-name safe version of a group name."""
+    return re.sub(r'[^\w.-]+', '_', group).strip('_') or 'group'
+
+
+def group_recipients(group):
+    """Recipients for one group: recipients_<group>.txt if present, else the default list."""
+    group_file = f"recipients_{_group_file_tag(group)}.txt"
+    return load_recipients(group_file if os.path.exists(group_file) else RECIPIENTS_FILE)
+
+
+def load_fan_out_window(start_date, end_date, excel_files, exclusions, out_path):
+    """Scan the window once into an Arrow IPC file with an ``excluded`` flag; returns the UUT set."""
+    parquet_files = ensure_parquet_cache(excel_files)
+    if not parquet_files:
+        return set()
+    source = f"read_parquet({_sql_path_list(parquet_files)})"
+    where = _window_sql(start_date, end_date)
+    con = duckdb.connect()
+    excluded = _exclusion_sql(con, source, where, exclusions) if exclusions else "FALSE"
+    table = con.execute(
+        f"SELECT {', '.join(ESSENTIAL_COLS)}, {excluded} AS excluded FROM {source} WHERE {where}"
+    ).arrow()
+    if isinstance(table, pa.RecordBatchReader):
+        table = table.read_all()
+    con.close()
+    with pa.OSFile(out_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return set(table.column('UUT').unique().to_pylist())
+
+
+def _build_group_report(task):
+    """Worker: build one group's workbook, trend sheets and email HTML from the shared IPC file.
+
+    Top-level so it can be pickled; returns a result dict (``error`` set on failure).
+    """
+    group = task['group']
+    result = {'group': group, 'report_file': None, 'html_table': None, 'chart_files': [],
+              'rows': 0, 'top': [], 'extra_sections': [], 'archive': None, 'error': None}
+    try:
+        import pyarrow.compute as pc
+        # Memory-mapped: every worker reads the same pages instead of its own copy
+        shared = pa.ipc.open_file(pa.memory_map(task['ipc_path'], 'r')).read_all()
+        table = shared.filter(pc.is_in(shared.column('UUT'), value_set=pa.array(task['uuts'])))
+        start_date, end_date = task['start_date'], task['end_date']
+        con = duckdb.connect()
+        con.register('group_rows', table)
+        shift_metrics = query_shift_metrics(con, 'group_rows', _window_sql(start_date, end_date),
+                                            excluded='excluded', approx=task['approx'])
+        fail_df = con.execute(
+            f"SELECT *, {_shift_sql()} AS Shift FROM group_rows "
+            f"WHERE {_window_sql(start_date, end_date)} AND NOT excluded "
+            f"AND lower(SyndromStatus) IS DISTINCT FROM 'pass'"
+        ).df()
+        trend_df = None
+        if task['trend_start']:
+            trend_df = con.execute(
+                f"SELECT {', '.join(ESSENTIAL_COLS)} FROM group_rows "
+                f"WHERE {_window_sql(task['trend_start'], task['trend_end'])}"
+            ).df()
+        con.close()
+
+        # Same order as load_top_syndroms(): descending count, ties by name
+        ranking = (fail_df.groupby('Syndrom').size().rename('fails').reset_index()
+                   .sort_values(['fails', 'Syndrom'], ascending=[False, True]).set_index('Syndrom')['fails'])
+        top_syndroms = ranking.head(TOP_N).index.tolist()
+        report_rows = build_report_rows(fail_df, top_syndroms, shift_metrics)
+        result.update(rows=len(report_rows), top=top_syndroms)
+        if not report_rows:
+            return result
+
+        report_columns = report_columns_for(shift_metrics)
+        if task['prior_fails'] is not None:
+            add_prior_fails(report_rows, report_columns, start_date, excel_files=task['prior_fails'])
+        report_df = pd.DataFrame(report_rows)[report_columns]
+        wb = write_report_workbook(task['report_file'], report_df, report_rows, report_columns,
+                                   approx=shift_metrics.get('approx', False), spikes=task['spikes'])
+        daily_df = weekly_df = None
+        if trend_df is not None and not trend_df.empty:
+            # The group's Top N, or the first --trend-top syndroms of its ranking
+            trend_syndroms = ranking.index[:task['trend_top']].tolist() if task['trend_top'] else top_syndroms
+            trend_tables = build_trend_tables(trend_df, trend_syndroms, task['trend_granularities'])
+            write_trend_sheets(wb, trend_tables)
+            daily_df, weekly_df = trend_long(trend_tables.get('daily')), trend_long(trend_tables.get('weekly'))
+        wb.save(task['report_file'])
+        result['report_file'] = task['report_file']
+        # Archived by the parent so the archive has a single writer
+        result['archive'] = {'ranking': ranking, 'report_rows': report_rows,
+                             'rate_table': build_rate_table(fail_df, top_syndroms, shift_metrics),
+                             'daily_df': daily_df, 'weekly_df': weekly_df}
+
+        result['html_table'] = create_html_table(create_email_summary_table(report_rows))
+        if task['spikes'] is not None and not task['spikes'].empty:
+            result['extra_sections'].append(("Spikes", create_html_table(format_spikes(task['spikes']))))
+        if daily_df is not None:
+            result['chart_files'] = generate_chart_images(daily_df, weekly_df, top_syndroms, start_date, end_date,
+                                                          file_prefix=f"{_group_file_tag(group)}_")
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def run_fan_out(args, start_date, end_date, files, exclusions, trend_window=(None, None), trend_files=(),
+                spikes=None):
+    """Generate one report per product group in parallel and e-mail each from the parent process.
+
+    ``spikes`` (from run_spike_detection()) is split by UUT, so each group's
+    workbook lists the spikes of its own UUTs.
+    """
+    trend_start, trend_end = trend_window
+    load_start = min(start_date, trend_start) if trend_start else start_date
+    load_end = max(end_date, trend_end) if trend_end else end_date
+    load_files = list(dict.fromkeys(list(files) + list(trend_files)))
+    mapping = load_product_groups(args.group_map) if args.fan_out == 'map' else None
+
+    tmp_dir = tempfile.mkdtemp(prefix="tla_fanout_")
+    try:
+        ipc_path = os.path.join(tmp_dir, "window.arrow")
+        with RUN.stage('fan-out load', rows_in=len(load_files)) as st:
+            st['bytes_read'] = _total_size(load_files)
+            uuts = load_fan_out_window(load_start, load_end, load_files, exclusions, ipc_path)
+        groups = group_uuts(uuts, args.fan_out, mapping)
+        if not groups:
+            print("No data found for the selected date range!")
+            return []
+        print(f"\nFan-out ({args.fan_out}): {len(groups)} group(s)")
+        for group, members in groups.items():
+            print(f"  {group}: {len(members)} UUT(s)")
+
+        prior_files = None
+        if args.prior_fails:
+            # Index once here; workers only read the index files of these exports
+            prior_files = list_excel_files()
+            ensure_sn_index(prior_files)
+        base, ext = os.path.splitext(REPORT_FILE)
+        tasks = [{
+            'group': group, 'uuts': members, 'ipc_path': ipc_path,
+            'start_date': start_date, 'end_date': end_date,
+            'trend_start': trend_start, 'trend_end': trend_end,
+            'trend_granularities': args.trend_granularity, 'approx': args.approx,
+            'trend_top': args.trend_top, 'prior_fails': prior_files,
+            'spikes': None if spikes is None else spikes[spikes['UUT'].isin(members)].reset_index(drop=True),
+            'report_file': f"{base}_{_group_file_tag(group)}{ext}",
+        } for group, members in groups.items()]
+        workers = min(len(tasks), os.cpu_count() or 1)
+        with RUN.stage('fan-out reports', rows_in=len(tasks)) as st:
+            if workers > 1:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_build_group_report, tasks))
+            else:
+                results = [_build_group_report(t) for t in tasks]
+            st['rows_out'] = sum(r['rows'] for r in results)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for res in results:
+        if res['error']:
+            print(f"\n[{res['group']}] failed: {res['error']}")
+        elif not res['report_file']:
+            print(f"\n[{res['group']}] no failed tests in the selected date range")
+        else:
+            print(f"\n[{res['group']}] report generated: {res['report_file']} (Top {TOP_N}: {', '.join(res['top'])})")
+
+    if not args.no_archive:
+        archived = [res for res in results if res['archive']]
+        with RUN.stage('archive results', rows_in=len(archived)):
+            for res in archived:
+                archive_report_results(start_date, end_date, params={**RUN.params, 'group': res['group']},
+                                       group=res['group'], **res['archive'])
+        if archived:
+            print(f"\nResults of {len(archived)} group(s) archived in {REPORT_ARCHIVE_DIR}/")
+
+    # Outlook automation is single-threaded COM; send from the parent, one group at a time
+    with RUN.stage('outlook send', rows_in=len(results)):
+        for res in results:
+            if not res['report_file']:
+                continue
+            recipients = group_recipients(res['group'])
+            if recipients:
+                send_email_with_charts(recipients, res['chart_files'], res['html_table'], start_date, end_date,
+                                       extra_sections=res['extra_sections'],
+                                       title=f"Daily TLA Report - {res['group']}")
+            else:
+                print(f"No recipients for {res['group']}, skipping email.")
+                for chart_file in res['chart_files']:
+                    if os.path.exists(chart_file):
+                        os.remove(chart_file)
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Daily TLA Report Generator")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help="Dump a cProfile/pyinstrument profile of the run next to the run log")
+    parser.add_argument('--run-log', metavar='PATH',
+                        help=f"Where to write the JSON run log (default: {RUN_LOG_DIR}/run_<timestamp>.json)")
+    parser.add_argument('--sn-history', nargs='+', metavar='SN',
+                        help="Print the full test history of the given serial numbers and exit")
+    parser.add_argument('--prior-fails', action='store_true',
+                        help="Add a 'Prior Fails' column (fails before the report window) to the report sheet")
+    parser.add_argument('--delta', action='store_true',
+                        help="Only ingest what changed since the previous delta run and highlight Top-N/rate changes")
+    parser.add_argument('--delta-threshold', type=float, default=DELTA_RATE_THRESHOLD, metavar='PCT',
+                        help=f"Rate move (percentage points) flagged in delta mode (default: {DELTA_RATE_THRESHOLD})")
+    parser.add_argument('--no-archive', action='store_true',
+                        help=f"Do not append this run's results to {REPORT_ARCHIVE_DIR}/")
+    parser.add_argument('--archive-rank', metavar='SYNDROM',
+                        help="Show how a syndrom ranked in the archived reports, then exit")
+    parser.add_argument('--last', type=int, default=60, metavar='N',
+                        help="Number of archived reports shown by --archive-rank (default: 60)")
+    parser.add_argument('--archive-sql', metavar='SQL',
+                        help=f"Run a DuckDB query over the archive (views: {', '.join(ARCHIVE_KINDS)}), then exit")
+    parser.add_argument('--fan-out', choices=['uut-prefix', 'uut', 'map'],
+                        help=f"Build one report per product group (UUT family prefix, UUT, or {PRODUCT_GROUPS_FILE}) in parallel")
+    parser.add_argument('--group-map', default=PRODUCT_GROUPS_FILE, metavar='PATH',
+                        help=f"UUT glob = group mapping used by --fan-out map (default: {PRODUCT_GROUPS_FILE})")
+    parser.add_argument('--approx', action='store_true',
+                        help="Estimate unique-SN denominators with HyperLogLog (faster, less memory; rates marked '~', no yields)")
+    parser.add_argument('--spike-days', type=int, default=SPIKE_BASELINE_DAYS, metavar='N',
+                        help=f"Days of history before the window used as spike baseline; 0 disables spike detection (default: {SPIKE_BASELINE_DAYS})")
+    parser.add_argument('--spike-sigma', type=float, default=SPIKE_SIGMA, metavar='K',
+                        help=f"Control-limit width in sigmas for spike detection (default: {SPIKE_SIGMA:g})")
+    parser.add_argument('--trend-granularity', type=_trend_granularity_list, metavar='LIST',
+                        default=DEFAULT_TREND_GRANULARITIES,
+                        help=f"Comma separated trend sheets to build from {', '.join(TREND_GRANULARITIES)} "
+                             f"(default: {','.join(DEFAULT_TREND_GRANULARITIES)})")
+    parser.add_argument('--trend-top', type=int, metavar='N',
+                        help=f"Number of top syndroms in the trend sheets (default: the report's Top {TOP_N})")
+    return parser.parse_args(argv)
+
+def _trend_granularity_list(value):
+    """argparse type for --trend-granularity."""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in TREND_GRANULARITIES]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(f"choose from {', '.join(TREND_GRANULARITIES)}")
+    return tuple(dict.fromkeys(names))
+
+def main(args=None):
+    if args is None:
+        args = parse_args([])
+    if args.sn_history:
+        print_sn_history(args.sn_history)
+        return
+    if args.archive_rank:
+        print_archive_rank(args.archive_rank, last=args.last)
+        return
+    if args.archive_sql:
+        if archive_has_runs():
+            print(query_archive(args.archive_sql).to_string(index=False))
+        return
+
     print("=== Daily TLA Report Generator ===")
     
     # Find available Excel files and dates
-    file_dates = find_excel_files()
+    with RUN.stage('discover files') as st:
+        file_dates = find_excel_files()
+        st['rows_out'] = len(file_dates)
+        st['bytes_read'] = _total_size([info['file'] for info in file_dates])
     if not file_dates:
         print("No Excel files found in the current directory!")
         return
@@ -744,84 +2817,106 @@ def main():
     start_date, end_date = get_user_date_selection(file_dates, "main report")
     if start_date is None:
         return
+    RUN.params.update({'start_date': start_date, 'end_date': end_date})
     
     # Pre-filter the file list so we only open spreadsheets that can possibly contain the requested dates
     files_in_range = [info['file'] for info in file_dates if not (info['max_date'] < start_date or info['min_date'] > end_date)]
 
-    # Load data for the selected date range – DuckDB over cached parquet
-    df = load_data_duckdb(start_date, end_date, files_in_range)
-    if df is None:
+    exclusions = load_exclusion_rules()
+    changes = None
+
+    if args.fan_out:
+        # One load, one report per product group; trend window is asked up front
+        # because the groups are built in worker processes
+        if args.delta:
+            print("Note: --delta is ignored with --fan-out")
+        trend_window, trend_files = (None, None), []
+        print("\nDo you want to generate trend charts? (y/n): ", end="")
+        if input().strip().lower() == 'y':
+            trend_start, trend_end = get_user_date_selection(file_dates, "trend analysis")
+            if trend_start and trend_end:
+                RUN.params.update({'trend_start': trend_start, 'trend_end': trend_end})
+                trend_window = (trend_start, trend_end)
+                trend_files = [info['file'] for info in file_dates if not (info['max_date'] < trend_start or info['min_date'] > trend_end)]
+        spikes = run_spike_detection(args, file_dates, start_date, end_date, exclusions)
+        run_fan_out(args, start_date, end_date, files_in_range, exclusions, trend_window, trend_files, spikes)
         return
-    
-    # Add shift information (vectorised for speed)
-    df['Shift'] = vectorized_shift(df['StartDateTime'])
-    
-    # Only consider failed tests
-    fail_df = df[df['SyndromStatus'].str.lower() != 'pass']
-    
-    # Exclude syndroms from the list
-    exclude_set = load_exclude_list()
-    fail_df = fail_df[~fail_df['Syndrom'].isin(exclude_set)]
-    
-    # Find top 3 syndroms by total fail count for the main report date range
-    top_syndroms = (
-        fail_df.groupby('Syndrom').size().sort_values(ascending=False).head(3).index.tolist()
-    )
 
-    # NEW: Preview the top 3 syndroms to the user
-    print("\nTop 3 Syndroms for the selected date range:")
-    for idx, syndrom in enumerate(top_syndroms, start=1):
-        syndrom_fail_count = fail_df[fail_df['Syndrom'] == syndrom].shape[0]
+    # Rank syndroms from the per-day counters kept at ingestion, so the preview
+    # is shown before any raw rows of the window are read
+    with RUN.stage('top-n counters', rows_in=len(files_in_range)) as st:
+        # Full ranking (for the results archive); the report uses its head
+        ranking = load_top_syndroms(start_date, end_date, files_in_range, exclusions=exclusions, n=None)
+        st['rows_out'] = len(ranking)
+    top_counts = ranking.head(TOP_N)
+    top_syndroms = top_counts.index.tolist()
+
+    # NEW: Preview the top syndroms to the user
+    print(f"\nTop {TOP_N} Syndroms for the selected date range:")
+    for idx, (syndrom, syndrom_fail_count) in enumerate(top_counts.items(), start=1):
         print(f"{idx}. {syndrom} - {syndrom_fail_count} fails")
     print("-" * 40)
 
-    top_fail_df = fail_df[fail_df['Syndrom'].isin(top_syndroms)]
-    
-    # Total SNs for the main report date range
-    total_sns_for_day = df['SerialNumber'].nunique()
+    if args.delta and args.approx:
+        print("Note: --approx is ignored in delta mode (denominators come from the stored SN sets)")
+    if args.delta:
+        # Delta mode: only rows newer than the previous run are read; counts, rates and
+        # yields are updated from the aggregates persisted in DELTA_STATE_DIR
+        with RUN.stage('delta update', rows_in=len(files_in_range)) as st:
+            delta = update_delta_state(start_date, end_date, files_in_range, exclusions)
+            fail_df, shift_metrics = delta['fail_df'], delta['shift_metrics']
+            st['rows_out'] = len(fail_df)
+    else:
+        # Load data for the selected date range – DuckDB over cached parquet.
+        # Exclusion rules are resolved on the syndrom dictionary and applied inside the scan.
+        with RUN.stage('load window', rows_in=len(files_in_range)) as st:
+            df = load_data_duckdb(start_date, end_date, files_in_range, exclusions=exclusions)
+            st['rows_out'] = 0 if df is None else len(df)
+        if df is None:
+            return
+        # Rate denominators (unique SNs per UUT/shift, unfiltered window) and retest-aware
+        # yields come from one DuckDB window-function pass over the same caches
+        shift_metrics = load_shift_metrics(start_date, end_date, files_in_range, exclusions=exclusions,
+                                           approx=args.approx)
+
+        # Add shift information (vectorised for speed)
+        df['Shift'] = vectorized_shift(df['StartDateTime'])
+        # Only consider failed tests (excluded syndroms were already dropped by the scan)
+        fail_df = df[df['SyndromStatus'].str.lower() != 'pass']
     
-    # Prepare report data: one row per SN
-    report_rows = []
-    for syndrom in top_syndroms:
-        golden_img, defect_img, description = get_syndrom_db_info(syndrom)
-        syndrom_fails = top_fail_df[top_fail_df['Syndrom'] == syndrom]
-        for uut in syndrom_fails['UUT'].unique():
-            uut_df = syndrom_fails[syndrom_fails['UUT'] == uut]
-            for shift in ['1st Shift', '2nd Shift']:
-                shift_fails = uut_df[uut_df['Shift'] == shift]
-                fail_count = len(shift_fails)
-                # Calculate unique SNs for this UUT and shift
-                total_sns_for_shift = pd.Series(df[(df['UUT'] == uut) & (df['Shift'] == shift)]['SerialNumber']).nunique()
-                rate = f"{(fail_count/total_sns_for_shift*100):.2f}%" if total_sns_for_shift > 0 else "N/A"
-                for sn in shift_fails['SerialNumber'].astype(str):
-                    report_rows.append({
-                        'Monitor Name': syndrom,
-                        'UUT': uut,
-                        'Shift': shift,
-                        'Rate': rate,
-                        'SN': sn,
-                        'Golden Image': golden_img,
-                        'Defect Image': defect_img,
-                        'Description': description or ''
-                    })
+    with RUN.stage('aggregate', rows_in=len(fail_df)) as agg_stage:
+        # Prepare report data: one row per SN
+        report_rows = build_report_rows(fail_df, top_syndroms, shift_metrics)
+        agg_stage['rows_out'] = len(report_rows)
+
+    if args.delta:
+        rates = compute_report_rates(fail_df, top_syndroms, shift_metrics['sn_totals'])
+        changes = finish_delta_run(delta, top_syndroms, rates, threshold=args.delta_threshold)
+        if changes is None:
+            print("\nNo previous delta report to compare with; changes are listed from the next run.")
+        elif changes:
+            print("\nChanges since the last report:")
+            for change in changes:
+                detail = f" [{change['UUT']} / {change['Shift']}] {change['Previous Rate']} -> {change['Rate']}" if change['UUT'] else ""
+                print(f"  {change['Change']}: {change['Monitor Name']}{detail}")
+        else:
+            print("\nNo changes since the last report.")
+
+    spikes = run_spike_detection(args, file_dates, start_date, end_date, exclusions, top_syndroms)
+
+    report_columns = report_columns_for(shift_metrics)
+    if args.prior_fails and report_rows:
+        # Look up earlier fails of the reported SNs in the SerialNumber index
+        add_prior_fails(report_rows, report_columns, start_date)
     
     # Create DataFrame for Excel
     report_df = pd.DataFrame(report_rows)
     if not report_df.empty:
-        report_df = report_df[['Monitor Name', 'UUT', 'Shift', 'Rate', 'SN', 'Golden Image', 'Defect Image', 'Description']]
+        report_df = report_df[report_columns]
         
-        # Write to Excel with all columns
-        with pd.ExcelWriter(REPORT_FILE, engine='openpyxl') as writer:
-            report_df.to_excel(writer, index=False, sheet_name='Top 3 Syndroms')
-        
-        # Now add images using openpyxl
-        wb = load_workbook(REPORT_FILE)
-        ws = wb['Top 3 Syndroms']
-        # Merge and insert images per unique syndrom
-        create_merged_image_and_description_cells(ws, report_rows, syndrom_col=1, golden_img_col=6, defect_img_col=7, desc_col=8)
-        # Merge cells for Monitor Name, UUT, Shift, and Rate
-        for col_idx in [0, 1, 2, 3]:  # Monitor Name, UUT, Shift, Rate
-            merge_consecutive_cells(ws, col_idx)
+        with RUN.stage('write report sheet', rows_in=len(report_df)):
+            wb = write_report_workbook(REPORT_FILE, report_df, report_rows, report_columns,
+                                       approx=shift_metrics.get('approx', False), changes=changes, spikes=spikes)
         
         # Ask if user wants trend charts
         print("\nDo you want to generate trend charts? (y/n): ", end="")
@@ -831,42 +2926,84 @@ def main():
             # Get date selection for trend analysis
             trend_start, trend_end = get_user_date_selection(file_dates, "trend analysis")
             if trend_start and trend_end:
+                RUN.params.update({'trend_start': trend_start, 'trend_end': trend_end})
                 # Re-use the same pre-filtering idea for the trend window
                 trend_files = [info['file'] for info in file_dates if not (info['max_date'] < trend_start or info['min_date'] > trend_end)]
-                trend_df = load_data_duckdb(trend_start, trend_end, trend_files)
+                with RUN.stage('load trend window', rows_in=len(trend_files)) as st:
+                    trend_df = load_data_duckdb(trend_start, trend_end, trend_files)
+                    st['rows_out'] = 0 if trend_df is None else len(trend_df)
                 if trend_df is not None:
-                    # Calculate trend data using the same top 3 syndroms from main report
-                    daily_df, weekly_df = calculate_trend_data(trend_df, top_syndroms)
-                    
-                    # Create trend charts
-                    create_trend_charts(wb, daily_df, weekly_df, top_syndroms)
+                    with RUN.stage('trend sheets', rows_in=len(trend_df)):
+                        # Trend the report's Top N, or the first --trend-top syndroms of the ranking
+                        trend_syndroms = ranking.index[:args.trend_top].tolist() if args.trend_top else top_syndroms
+                        trend_tables = build_trend_tables(trend_df, trend_syndroms, args.trend_granularity)
+                        write_trend_sheets(wb, trend_tables)
+                        # Long daily/weekly frames for the e-mail charts and the archive
+                        daily_df = trend_long(trend_tables.get('daily'))
+                        weekly_df = trend_long(trend_tables.get('weekly'))
                     print("Trend charts added to Excel file!")
         
-        wb.save(REPORT_FILE)
+        with RUN.stage('save workbook'):
+            wb.save(REPORT_FILE)
         print(f'\nReport generated: {REPORT_FILE}')
         print(f'Date range: {start_date} to {end_date}')
 
+        if not args.no_archive:
+            with RUN.stage('archive results', rows_in=len(report_rows)):
+                run_id = archive_report_results(
+                    start_date, end_date, ranking, report_rows,
+                    build_rate_table(fail_df, top_syndroms, shift_metrics),
+                    daily_df=locals().get('daily_df'), weekly_df=locals().get('weekly_df'), params=RUN.params)
+            print(f"Results archived as run {run_id} in {REPORT_ARCHIVE_DIR}/")
+
         # Load recipients and send email
         recipients = load_recipients()
         if recipients:
-            # Create summary table for email (without SNs)
-            summary_df = create_email_summary_table(report_rows)
-            html_table = create_html_table(summary_df)
-            
-            # Initialize chart files list
-            chart_files = []
-            
-            # Generate chart images if trend data exists
-            if 'daily_df' in locals() and 'weekly_df' in locals():
-                chart_files = generate_chart_images(daily_df, weekly_df, top_syndroms, start_date, end_date)
+            with RUN.stage('email images', rows_in=len(report_rows)):
+                # Create summary table for email (without SNs)
+                summary_df = create_email_summary_table(report_rows)
+                html_table = create_html_table(summary_df)
+                
+                # Initialize chart files list
+                chart_files = []
+                
+                # Generate chart images if trend data exists
+                if 'daily_df' in locals() and 'weekly_df' in locals():
+                    chart_files = generate_chart_images(daily_df, weekly_df, top_syndroms, start_date, end_date)
+
+                extra_sections = []
+                if changes:
+                    extra_sections.append(("Changes Since Last Report", create_html_table(pd.DataFrame(changes))))
+                if spikes is not None and not spikes.empty:
+                    extra_sections.append(("Spikes", create_html_table(format_spikes(spikes))))
             
             # Send email with charts and table
-            send_email_with_charts(recipients, chart_files, html_table, start_date, end_date)
+            with RUN.stage('outlook send', rows_in=len(recipients)):
+                send_email_with_charts(recipients, chart_files, html_table, start_date, end_date,
+                                       extra_sections=extra_sections)
         else:
             print("No recipients found in recipients.txt, skipping email.")
 
     else:
         print("No failed tests found for the selected date range!")
 
+def run(argv=None):
+    """Entry point: run ``main`` (optionally under a profiler), then emit the run log and summary."""
+    args = parse_args(argv)
+    RUN.params['argv'] = sys.argv[1:] if argv is None else list(argv)
+    try:
+        if args.profile:
+            os.makedirs(RUN_LOG_DIR, exist_ok=True)
+            out_base = os.path.join(RUN_LOG_DIR, f"run_{RUN.started:%Y%m%d_%H%M%S}")
+            run_with_profiler(lambda: main(args), args.profile, out_base)
+        else:
+            main(args)
+    finally:
+        RUN.print_summary()
+        try:
+            print(f"Run log written: {RUN.write_log(args.run_log)}")
+        except OSError as e:
+            print(f"Warning: Could not write run log: {e}")
+
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    run()
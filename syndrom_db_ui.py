@@ -13,32 +13,285 @@ Features:
    - golden.jpg
    - defect.jpg
    - description.txt  (first line contains Monitor name, rest is description)
+   - thumbs/          (report and email thumbnails of both images)
+6. Bulk import from a folder tree or a CSV manifest
+
+Images are normalized in background worker processes: they are stored as
+real JPEG files capped at MAX_IMAGE_SIZE, and the thumbnails used by the
+report and the email are generated once, at import time. Every import
+updates `SyndromDB/index.json`.
 
 Run the script from the project root:
     python syndrom_db_ui.py
+    python syndrom_db_ui.py --import "D:\\Syndroms"            # one sub-folder per syndrom
+    python syndrom_db_ui.py --import syndroms.csv              # syndrom,golden,defect,description
+    python syndrom_db_ui.py --rebuild                          # normalize the existing DB in place
 """
 
+import argparse
+import concurrent.futures
+import csv
+import json
 import os
 import re
 import shutil
 import tkinter as tk
+from datetime import datetime
 from tkinter import filedialog, messagebox, scrolledtext
 
+from PIL import Image, ImageOps
+
 # Path to the SyndromDB directory (relative to this script)
 SYNDROM_DB_PATH = os.path.join(os.path.dirname(__file__), "SyndromDB")
 
 # Regex pattern for characters that are illegal in Windows folder names
 ILLEGAL_CHARS = r"[\\/:*?\"<>|]"
 
+# SyndromDB index (one entry per syndrom folder)
+INDEX_FILE = os.path.join(SYNDROM_DB_PATH, "index.json")
+
+# Stored images are re-encoded as JPEG no larger than this (width, height)
+MAX_IMAGE_SIZE = (1600, 1600)
+JPEG_QUALITY = 90
+IMAGE_KINDS = ("golden", "defect")
+# EXIF orientation; images with another value are rotated upright when normalized
+ORIENTATION_TAG = 0x0112
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+# Pre-generated thumbnails in <syndrom>/thumbs/<kind>_<purpose>.jpg, read by
+# generate_daily_report.py: 'report' is embedded in the workbook (shown at
+# 80x60), 'email' is embedded in the mail table (shown at 400x400)
+THUMB_DIR = "thumbs"
+THUMB_SIZES = {"report": (160, 120), "email": (400, 400)}
+THUMB_QUALITY = 85
+
+
 def sanitize_name(name: str) -> str:
     """Replace illegal path characters with a hyphen."""
     return re.sub(ILLEGAL_CHARS, "-", name).strip()
 
+# ----------------------------------------------------------------------
+# Image normalization (runs in worker processes)
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Flatten transparency onto white and convert to RGB."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _save_jpeg(img: Image.Image, path: str, quality: int) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    img.save(tmp_path, format="JPEG", quality=quality)
+    os.replace(tmp_path, path)
+
+
+def normalize_image(src: str, dst: str, kind: str) -> dict:
+    """Store ``src`` as a real JPEG at ``dst`` (capped at MAX_IMAGE_SIZE) and write its thumbnails.
+
+    Upright RGB JPEGs within the cap are kept byte for byte (no re-encoding loss).
+    Returns the image's index entry.
+    """
+    with Image.open(src) as opened:
+        opened.load()
+        source_format = opened.format
+        upright = opened.getexif().get(ORIENTATION_TAG, 1) == 1
+        keep = (source_format == "JPEG" and opened.mode == "RGB" and upright
+                and opened.width <= MAX_IMAGE_SIZE[0] and opened.height <= MAX_IMAGE_SIZE[1])
+        img = _to_rgb(ImageOps.exif_transpose(opened))
+    if keep:
+        if os.path.abspath(src) != os.path.abspath(dst):
+            shutil.copyfile(src, dst)
+    else:
+        img.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+        _save_jpeg(img, dst, JPEG_QUALITY)
+
+    thumb_dir = os.path.join(os.path.dirname(dst), THUMB_DIR)
+    os.makedirs(thumb_dir, exist_ok=True)
+    thumbs = {}
+    for purpose, size in THUMB_SIZES.items():
+        # Same fixed-size resize the report and email used to do on every run
+        thumb_path = os.path.join(thumb_dir, f"{kind}_{purpose}.jpg")
+        _save_jpeg(img.resize(size, Image.Resampling.LANCZOS), thumb_path, THUMB_QUALITY)
+        thumbs[purpose] = os.path.join(THUMB_DIR, f"{kind}_{purpose}.jpg").replace(os.sep, "/")
+    return {"file": os.path.basename(dst), "size": list(img.size), "source_format": source_format,
+            "thumbs": thumbs}
+
+
+def import_record(record: dict, overwrite: bool = False) -> dict:
+    """Worker: create/update one syndrom folder from ``record`` and return its index entry.
+
+    ``record`` has ``syndrom`` and optional ``golden``/``defect`` image paths,
+    ``description`` (None keeps an existing description.txt) and ``folder``
+    (default: the sanitized syndrom name).
+    """
+    syndrom = record["syndrom"].strip()
+    folder_name = record.get("folder") or sanitize_name(syndrom)
+    if not folder_name:
+        raise ValueError("Syndrom name is required.")
+    target_dir = os.path.join(SYNDROM_DB_PATH, folder_name)
+    created = not os.path.isdir(target_dir)
+    if not created and not overwrite:
+        raise FileExistsError(f"A record for the syndrom '{syndrom}' already exists.")
+    for kind in IMAGE_KINDS:
+        if record.get(kind) and not os.path.isfile(record[kind]):
+            raise FileNotFoundError(f"{kind} image not found: {record[kind]}")
+    os.makedirs(target_dir, exist_ok=True)
+
+    entry = {"syndrom": syndrom, "folder": folder_name, "images": {},
+             "updated": datetime.now().isoformat(timespec="seconds")}
+    desc_path = os.path.join(target_dir, "description.txt")
+    try:
+        for kind in IMAGE_KINDS:
+            src = record.get(kind)
+            if src:
+                entry["images"][kind] = normalize_image(src, os.path.join(target_dir, f"{kind}.jpg"), kind)
+        if record.get("description") is not None:
+            with open(desc_path, "w", encoding="utf-8") as fh:
+                fh.write(f"{record['description'].strip()}\n")
+    except Exception:
+        # Don't leave a half-written new record behind (it would block a retry)
+        if created:
+            shutil.rmtree(target_dir, ignore_errors=True)
+        raise
+    entry["has_description"] = os.path.exists(desc_path)
+    return entry
+
+# ----------------------------------------------------------------------
+# Bulk import sources, index and worker pool
+
+def _find_image(folder: str, kind: str):
+    """First file in ``folder`` named ``<kind>.<image extension>`` (case-insensitive)."""
+    for name in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(name)
+        if stem.lower() == kind and ext.lower() in IMAGE_EXTENSIONS:
+            return os.path.join(folder, name)
+    return None
+
+
+def records_from_folder(root: str) -> list:
+    """One record per sub-folder of ``root``: folder name = syndrom, golden.*/defect.*/description.txt inside."""
+    records = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if not entry.is_dir() or entry.name == THUMB_DIR:
+            continue
+        desc_path = os.path.join(entry.path, "description.txt")
+        description = None
+        if os.path.exists(desc_path):
+            with open(desc_path, "r", encoding="utf-8") as fh:
+                description = fh.read()
+        records.append({"syndrom": entry.name, "golden": _find_image(entry.path, "golden"),
+                        "defect": _find_image(entry.path, "defect"), "description": description})
+    return records
+
+
+def records_from_csv(path: str) -> list:
+    """Records from a CSV manifest with columns syndrom, golden, defect, description.
+
+    Relative image paths are resolved against the CSV file's folder.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    records = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as fh:
+        for row in csv.DictReader(fh):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            if not row.get("syndrom"):
+                continue
+            record = {"syndrom": row["syndrom"], "description": row.get("description") or None}
+            for kind in IMAGE_KINDS:
+                if row.get(kind):
+                    record[kind] = os.path.join(base, os.path.expanduser(row[kind]))
+            records.append(record)
+    return records
+
+
+def records_for_rebuild() -> list:
+    """Records that re-normalize every existing SyndromDB folder in place (descriptions untouched).
+
+    The syndrom name is taken from the index when the folder is listed there,
+    since sanitize_name() is lossy ("A/B" and "A:B" both live in "A-B").
+    """
+    index = load_index()
+    records = []
+    for entry in sorted(os.scandir(SYNDROM_DB_PATH), key=lambda e: e.name):
+        if entry.is_dir():
+            images = {kind: os.path.join(entry.path, f"{kind}.jpg") for kind in IMAGE_KINDS}
+            syndrom = index.get(entry.name, {}).get("syndrom") or entry.name
+            records.append({"syndrom": syndrom, "folder": entry.name, "description": None,
+                            **{k: p for k, p in images.items() if os.path.exists(p)}})
+    return records
+
+
+def split_duplicates(records: list):
+    """Return (records, errors) keeping only the first record per target folder.
+
+    Different names can sanitize to the same folder; importing them
+    concurrently would race on the same files, so later ones are rejected.
+    """
+    kept, errors, owners = [], [], {}
+    for record in records:
+        folder = record.get("folder") or sanitize_name(record["syndrom"].strip())
+        if folder and folder in owners:
+            errors.append((record["syndrom"], f"same folder '{folder}' as '{owners[folder]}' in this import"))
+            continue
+        owners[folder] = record["syndrom"]
+        kept.append(record)
+    return kept, errors
+
+
+def load_index() -> dict:
+    if not os.path.exists(INDEX_FILE):
+        return {}
+    try:
+        with open(INDEX_FILE, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_index(entries: list) -> None:
+    """Merge index entries (by folder) into INDEX_FILE; only the main process writes it."""
+    if not entries:
+        return
+    index = load_index()
+    for entry in entries:
+        index[entry["folder"]] = entry
+    tmp_path = f"{INDEX_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(dict(sorted(index.items())), fh, indent=2)
+    os.replace(tmp_path, INDEX_FILE)
+
+
+def bulk_import(records: list, overwrite: bool = False, workers: int = None):
+    """Import ``records`` in parallel, update the index and return (entries, errors)."""
+    records, errors = split_duplicates(records)
+    entries = []
+    for syndrom, message in errors:
+        print(f"Skipped {syndrom}: {message}")
+    if not records:
+        return entries, errors
+    workers = workers or min(len(records), os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(import_record, record, overwrite): record for record in records}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            record = futures[future]
+            try:
+                entries.append(future.result())
+                print(f"[{done}/{len(futures)}] {record['syndrom']}")
+            except Exception as exc:
+                errors.append((record["syndrom"], str(exc)))
+                print(f"[{done}/{len(futures)}] {record['syndrom']}: {exc}")
+    update_index(entries)
+    return entries, errors
+
 class SyndromDBUI(tk.Tk):
     def __init__(self) -> None:
         super().__init__()
         self.title("SyndromDB Manager")
-        self.geometry("650x500")
+        self.geometry("650x560")
         self.resizable(False, False)
 
         # --- Widgets -------------------------------------------------------
@@ -67,6 +320,19 @@ class SyndromDBUI(tk.Tk):
         tk.Button(self, text="Save", width=12, command=self._save).grid(row=5, column=1, pady=15, sticky="e")
         tk.Button(self, text="Clear", width=12, command=self._clear).grid(row=5, column=2, pady=15, sticky="w")
 
+        # Bulk import
+        tk.Button(self, text="Import Folder...", width=14, command=self._import_folder).grid(row=6, column=1, sticky="e")
+        tk.Button(self, text="Import CSV...", width=12, command=self._import_csv).grid(row=6, column=2, sticky="w")
+        self.status = tk.StringVar()
+        tk.Label(self, textvariable=self.status, fg="#555").grid(row=7, column=0, columnspan=4, pady=10)
+
+        # Image work runs in a worker pool; the UI polls it with after()
+        self._pool = None
+        self._futures = {}
+        self._entries = []
+        self._errors = []
+        self.protocol("WM_DELETE_WINDOW", self._close)
+
     # ------------------------------------------------------------------
     def _browse_golden(self) -> None:
         path = filedialog.askopenfilename(
@@ -108,24 +374,79 @@ class SyndromDBUI(tk.Tk):
             )
             return
 
-        # All good — create directory and copy files -----------------------
-        os.makedirs(target_dir, exist_ok=False)  # Should succeed because we checked above
+        # All good — normalize images and write the folder in the background
+        record = {"syndrom": syndrom, "golden": golden or None, "defect": defect or None,
+                  "description": description}
+        if self._run([record], overwrite=False):
+            self._clear()
+
+    def _import_folder(self) -> None:
+        root = filedialog.askdirectory(title="Select a folder with one sub-folder per syndrom")
+        if root:
+            self._confirm_import(records_from_folder(root), root)
+
+    def _import_csv(self) -> None:
+        path = filedialog.askopenfilename(title="Select CSV manifest", filetypes=[("CSV Files", "*.csv")])
+        if path:
+            try:
+                records = records_from_csv(path)
+            except (OSError, csv.Error) as exc:
+                messagebox.showerror("Import Error", f"Could not read {path}:\n{exc}")
+                return
+            self._confirm_import(records, path)
+
+    def _confirm_import(self, records: list, source: str) -> None:
+        if not records:
+            messagebox.showwarning("Import", f"No syndroms found in {source}.")
+            return
+        existing = sum(os.path.isdir(os.path.join(SYNDROM_DB_PATH, sanitize_name(r["syndrom"]))) for r in records)
+        overwrite = False
+        if existing:
+            overwrite = messagebox.askyesno(
+                "Import", f"{existing} of {len(records)} syndrom(s) already exist.\nOverwrite them?")
+        self._run(records, overwrite)
 
-        try:
-            if golden:
-                shutil.copy(golden, os.path.join(target_dir, "golden.jpg"))
-            if defect:
-                shutil.copy(defect, os.path.join(target_dir, "defect.jpg"))
+    def _run(self, records: list, overwrite: bool) -> bool:
+        if self._futures:
+            messagebox.showwarning("Busy", "An import is still running.")
+            return False
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        records, duplicates = split_duplicates(records)
+        self._futures = {self._pool.submit(import_record, r, overwrite): r for r in records}
+        self._entries = []
+        self._errors = [f"{syndrom}: {message}" for syndrom, message in duplicates]
+        self._total = len(records)
+        self.status.set(f"Importing 0/{self._total}...")
+        self.after(200, self._poll)
+        return True
 
-            # Write description.txt
-            with open(os.path.join(target_dir, "description.txt"), "w", encoding="utf-8") as fh:
-                fh.write(f"{description}\n")
-        except Exception as exc:
-            messagebox.showerror("Save Error", f"Failed to save files:\n{exc}")
+    def _poll(self) -> None:
+        for future in [f for f in self._futures if f.done()]:
+            record = self._futures.pop(future)
+            try:
+                self._entries.append(future.result())
+            except Exception as exc:
+                self._errors.append(f"{record['syndrom']}: {exc}")
+        done = self._total - len(self._futures)
+        self.status.set(f"Importing {done}/{self._total}...")
+        if self._futures:
+            self.after(200, self._poll)
             return
+        update_index(self._entries)
+        self.status.set(f"Saved {len(self._entries)} syndrom(s), {len(self._errors)} error(s).")
+        if self._errors:
+            messagebox.showerror("Save Error", "Failed to save:\n" + "\n".join(self._errors[:20]))
+        elif self._total == 1:
+            messagebox.showinfo("Success", f"Syndrom '{self._entries[0]['syndrom']}' saved to "
+                                           f"{os.path.join(SYNDROM_DB_PATH, self._entries[0]['folder'])}")
+        else:
+            messagebox.showinfo("Import", f"Imported {len(self._entries)} syndrom(s).")
 
-        messagebox.showinfo("Success", f"Syndrom '{syndrom}' saved to {target_dir}")
-        self._clear()
+    def _close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=False)
+        self.destroy()
 
     def _clear(self) -> None:
         self.syndrom_entry.delete(0, tk.END)
@@ -134,10 +455,34 @@ class SyndromDBUI(tk.Tk):
         self.desc_text.delete("1.0", tk.END)
 
 # ----------------------------------------------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the SyndromDB (UI, or bulk import from the command line)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--import", dest="import_path", metavar="PATH",
+                        help="Import a folder tree (one sub-folder per syndrom) or a CSV manifest, then exit")
+    source.add_argument("--rebuild", action="store_true",
+                        help="Normalize every existing image, regenerate thumbnails and the index, then exit")
+    parser.add_argument("--overwrite", action="store_true", help="Replace syndroms that already exist")
+    parser.add_argument("--workers", type=int, metavar="N", help="Worker processes (default: CPU count)")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
     # Ensure the SyndromDB directory exists
     if not os.path.isdir(SYNDROM_DB_PATH):
         os.makedirs(SYNDROM_DB_PATH, exist_ok=True)
 
+    if args.import_path or args.rebuild:
+        if args.rebuild:
+            records = records_for_rebuild()
+        elif os.path.isdir(args.import_path):
+            records = records_from_folder(args.import_path)
+        else:
+            records = records_from_csv(args.import_path)
+        entries, errors = bulk_import(records, overwrite=args.overwrite or args.rebuild, workers=args.workers)
+        print(f"Imported {len(entries)} syndrom(s), {len(errors)} error(s); index: {INDEX_FILE}")
+        raise SystemExit(1 if errors else 0)
+
     app = SyndromDBUI()
     app.mainloop() 
\ No newline at end of file